@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Append-only JSONL hand-off files between stages (STATE_BACKEND=json).
+
+data/hn_with_text.jsonl and data/summaries.jsonl hold a header line
+({"_header": {...}}) followed by one JSON record per item. A stage writes
+<file>.partial, appending and fsyncing every record as soon as its item
+is done, and renames it over <file> once complete, so readers only ever
+see whole files and read them record by record.
+
+The header identifies the run: stage, run date, the settings that shape
+the output and the stories it covers (stories_id: the ordered hn_id / url
+list, which a re-run of fetch_hn.py reproduces even though points and
+comment counts have moved). A stage that is re-run after a crash finds
+the interrupted .partial with the same header, keeps its records
+(dropping a torn last line) and only processes the items that are not in
+it yet; any other .partial is discarded.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+def stories_id(items: Iterable[dict]) -> str:
+    """Hash of the ordered (hn_id, url) list of a run's stories."""
+    h = hashlib.sha256()
+    for it in items:
+        h.update(f"{it.get('hn_id', '')}\t{it.get('url') or ''}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def read_artifact(path: str | Path) -> tuple[dict, Iterator[dict]]:
+    """(header, records) of a committed artifact; records are read lazily."""
+    f = open(path, "rb")
+    try:
+        header = json.loads(f.readline()).get("_header", {})
+    except Exception:
+        f.close()
+        raise
+    return header, _records(f)
+
+
+def _records(f) -> Iterator[dict]:
+    with f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ArtifactWriter:
+    def __init__(self, path: str | Path, header: dict):
+        self.path = Path(path)
+        self.partial = self.path.with_name(self.path.name + ".partial")
+        self.header = header
+        self.resumed = 0
+        self._replay_from = 0
+        self._replay_to = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.partial.exists() and self._scan():
+            self.f = open(self.partial, "r+b")
+            self.f.truncate(self._replay_to)
+            self.f.seek(self._replay_to)
+        else:
+            self.f = open(self.partial, "wb")
+            self.write({"_header": header})
+
+    def _scan(self) -> bool:
+        """True if the existing .partial belongs to this run; notes its complete records."""
+        with open(self.partial, "rb") as f:
+            try:
+                first = f.readline()
+                if json.loads(first).get("_header") != json.loads(json.dumps(self.header)):
+                    return False
+            except ValueError:
+                return False
+            self._replay_from = self._replay_to = f.tell()
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write from the crash
+                try:
+                    json.loads(line)
+                except ValueError:
+                    break
+                self._replay_to += len(line)
+                self.resumed += 1
+        return True
+
+    def completed(self) -> Iterator[dict]:
+        """Records the interrupted run already wrote (empty for a fresh run)."""
+        if not self.resumed:
+            return
+        with open(self.partial, "rb") as f:
+            f.seek(self._replay_from)
+            while f.tell() < self._replay_to:
+                yield json.loads(f.readline())
+
+    def write(self, record: dict) -> None:
+        self.f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def commit(self) -> Path:
+        self.f.close()
+        os.replace(self.partial, self.path)
+        dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        return self.path
+
+
+def write_artifact(path: str | Path, header: dict, records: Iterable[dict]) -> Path:
+    """Write a whole artifact in one go (no resume)."""
+    path = Path(path)
+    path.with_name(path.name + ".partial").unlink(missing_ok=True)
+    w = ArtifactWriter(path, header)
+    for r in records:
+        w.write(r)
+    return w.commit()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: head-only OGP extractor vs. full BeautifulSoup parse.
+
+Usage:
+  python bench/bench_ogp.py [page.html|https://... ...] [-n REPEAT]
+
+With no pages given, a synthetic ~1 MB article page is used. Save a few
+large real-world pages (e.g. `curl -o page.html <url>`) for realistic numbers.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import fetch_article_text as fat  # noqa: E402
+
+
+def extract_ogp_description_bs4(html: str) -> str:
+    """The previous implementation: full lxml tree + three soup.find scans."""
+    soup = BeautifulSoup(html, "lxml")
+    for sel in [
+        ("meta", {"property": "og:description"}),
+        ("meta", {"name": "description"}),
+        ("meta", {"property": "twitter:description"}),
+    ]:
+        tag = soup.find(*sel)
+        if tag and tag.get("content"):
+            return tag["content"].strip()
+    return ""
+
+
+def synthetic_page(paragraphs: int = 8000) -> str:
+    head = (
+        "<!doctype html><html><head><meta charset='utf-8'><title>Synthetic</title>"
+        + "<link rel='stylesheet' href='/a.css'>" * 50
+        + "<meta property='og:description' content='A synthetic page for benchmarking.'>"
+        + "</head>"
+    )
+    body = "".join(
+        f"<div class='p'><p>Paragraph {i} with <a href='/x{i}'>a link</a> and <b>bold</b> text.</p></div>"
+        for i in range(paragraphs)
+    )
+    return head + "<body>" + body + "</body></html>"
+
+
+def load(src: str) -> str:
+    if src.startswith(("http://", "https://")):
+        return fat.fetch(src)
+    return fat.decode_html(Path(src).read_bytes())
+
+
+def bench(fn, html: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(html)
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pages", nargs="*")
+    ap.add_argument("-n", "--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    pages = [(p, load(p)) for p in args.pages] or [("synthetic", synthetic_page())]
+    for name, html in pages:
+        old = bench(extract_ogp_description_bs4, html, args.repeat)
+        new = bench(fat.extract_ogp_description, html, args.repeat)
+        same = extract_ogp_description_bs4(html) == fat.extract_ogp_description(html)
+        print(
+            f"{name}: {len(html) / 1e6:.2f} MB  bs4={old * 1000:.2f} ms  "
+            f"head_only={new * 1000:.3f} ms  speedup={old / new:.0f}x  same_result={same}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""Offline end-to-end benchmark: time every stage against local stand-ins.
+
+Usage:
+  python bench/bench_pipeline.py [--items 20,100,500] [--latency-ms 50]
+                                 [--codex-delay 0.05] [--backend codex|openai]
+                                 [--warm] [--pipeline]
+                                 [--out results.json] [--compare old.json]
+
+Nothing leaves the machine:
+  - a local HTTP server replays the recorded Algolia responses and article
+    page in bench/fixtures/ (front page, comments, article HTML), with
+    --latency-ms added to every request, and accepts webhook POSTs
+  - bench/fake_codex.py stands in for the codex CLI (CODEX_BIN) and writes
+    a schema-valid summary after --codex-delay seconds; with
+    --backend openai the same server answers chat/completions requests
+    (SUMMARIZER_BACKEND=openai) after the same delay instead
+
+Each item count runs in a fresh temporary directory (cold caches) the way
+run.sh does: fetch_hn, fetch_article_text, pack_input, summarize,
+build_slack_payload and post_to_slack as separate processes. --warm runs the
+stages a second time in the same directory; --pipeline also times
+pipeline.py. Tuning variables from the environment (SUMMARIZE_CONCURRENCY,
+FETCH_CONCURRENCY, STATE_BACKEND, ...) are passed through.
+
+Results go to bench/results/pipeline-<commit>.json; pass --compare with an
+earlier file to print per-stage ratios.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from fake_codex import summary_for
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH = ROOT / "bench"
+FIXTURES = BENCH / "fixtures"
+FAKE_CODEX = BENCH / "fake_codex.py"
+
+STAGES = [
+    "fetch_hn",
+    "fetch_article_text",
+    "pack_input",
+    "summarize",
+    "build_slack_payload",
+    "post_to_slack",
+]
+
+# Defaults for the stages; anything already set in the environment wins
+STAGE_DEFAULTS = {
+    "FETCH_ARTICLE_BODY": "true",
+    "BODY_MODE": "ogp_only",
+    "HN_COMMENTS_MAX": "15",
+    # Every article lives on 127.0.0.1, so don't let the per-host cap serialize them
+    "FETCH_PER_HOST_MAX": os.getenv("FETCH_CONCURRENCY", "4"),
+    "SLACK_POST_DELAY": "0",
+    # Every stand-in article serves the same page, which dedup would collapse
+    "DEDUP": "false",
+    "PROMPT_LANG": "en",
+}
+
+
+class Fixtures:
+    def __init__(self, path: Path = FIXTURES):
+        self.front_page = json.loads((path / "front_page.json").read_text(encoding="utf-8"))["hits"]
+        self.comments = json.loads((path / "comments.json").read_text(encoding="utf-8"))["hits"]
+        self.article = (path / "article.html").read_bytes()
+
+    def front_page_hits(self, n: int, base: str) -> list[dict]:
+        """n front-page hits cycling through the recorded ones, with local article URLs."""
+        hits = []
+        for i in range(n):
+            h = dict(self.front_page[i % len(self.front_page)])
+            story_id = 50000000 + i
+            h["objectID"] = str(story_id)
+            h["story_id"] = story_id
+            h["points"] = max(1, (h.get("points") or 1) - i // len(self.front_page))
+            if h.get("url"):
+                h["url"] = f"{base}/article/{i}"
+            hits.append(h)
+        return hits
+
+    def comment_hits(self, story_id: str, n: int) -> list[dict]:
+        hits = []
+        for i in range(n):
+            h = dict(self.comments[i % len(self.comments)])
+            h["objectID"] = f"{story_id}{i:04d}"
+            h["story_id"] = int(story_id) if story_id.isdigit() else story_id
+            h["created_at_i"] = (h.get("created_at_i") or 0) + i
+            hits.append(h)
+        return hits
+
+
+class StandIn(ThreadingHTTPServer):
+    """Algolia + article hosts + Slack webhook on one local port."""
+
+    daemon_threads = True
+
+    def __init__(self, fixtures: Fixtures, latency: float, llm_delay: float = 0.0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.llm_delay = llm_delay
+        self.counts: Counter = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def base(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_error(self, request, client_address):
+        # Stage processes exit with keep-alive connections still open
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, kind: str) -> None:
+        with self.lock:
+            self.counts[kind] += 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StandIn
+
+    def log_message(self, format, *args):  # noqa: A002 - quiet
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload: dict) -> None:
+        self._send(200, json.dumps(payload).encode("utf-8"), "application/json; charset=utf-8")
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        u = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        per_page = int(q.get("hitsPerPage", "20"))
+        tags = q.get("tags", "")
+        fx = self.server.fixtures
+
+        if u.path == "/api/v1/search" and tags == "front_page":
+            self.server.count("algolia_front_page")
+            hits = fx.front_page_hits(per_page, self.server.base)
+            self._json({"hits": hits, "nbHits": len(hits), "page": 0, "nbPages": 1, "hitsPerPage": per_page})
+        elif u.path in ("/api/v1/search", "/api/v1/search_by_date") and "story_" in tags:
+            self.server.count("algolia_comments")
+            story_id = tags.rsplit("story_", 1)[1]
+            # Incremental fetches (numericFilters=created_at_i>...) find nothing new
+            hits = [] if "numericFilters" in q else fx.comment_hits(story_id, per_page)
+            self._json({"hits": hits, "nbHits": len(hits), "page": 0, "nbPages": 1, "hitsPerPage": per_page})
+        elif u.path.startswith("/article/"):
+            self.server.count("article")
+            self._send(200, fx.article, "text/html; charset=utf-8")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/webhook":
+            self.server.count("webhook")
+            self._send(200, b"ok", "text/plain")
+        elif self.path == "/v1/chat/completions":
+            self.server.count("llm")
+            time.sleep(self.server.llm_delay)
+            messages = json.loads(body)["messages"]
+            payload = json.loads(messages[-1]["content"])
+            result = {
+                "date": payload.get("date", ""),
+                "lang": "ja" if "OUTPUT_LANG=ja" in messages[0]["content"] else "en",
+                "items": [summary_for(it) for it in payload.get("items", [])],
+            }
+            self._json({
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(result)}}],
+                "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": 200 * len(result["items"])},
+            })
+        else:
+            self._send(404, b"not found", "text/plain")
+
+
+def stage_env(n: int, server: StandIn, codex_delay: float, backend: str = "codex") -> dict:
+    env = {**STAGE_DEFAULTS, **os.environ}
+    env.update({
+        "HN_API_BASE": f"{server.base}/api/v1",
+        "HN_TOP_N": str(n),
+        "BODY_FETCH_MAX": str(n),
+        "SLACK_WEBHOOK_URL": f"{server.base}/webhook",
+        "CODEX_BIN": str(FAKE_CODEX),
+        "FAKE_CODEX_DELAY_SEC": str(codex_delay),
+        "POST_EACH": "false",
+        "SUMMARIZER_BACKEND": backend,
+        "LLM_API_BASE": f"{server.base}/v1",
+        "LLM_API_KEY": "bench",
+    })
+    env["PROMPT_FILE"] = str(ROOT / "prompts" / f"{env['PROMPT_LANG']}.txt")
+    return env
+
+
+def run_stage(name: str, args: list[str], workdir: Path, env: dict) -> tuple[float, str]:
+    """Run one stage script in workdir. Returns (seconds, stdout)."""
+    start = time.perf_counter()
+    r = subprocess.run(
+        [sys.executable, str(ROOT / f"{name}.py"), *args],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    (workdir / f"{name}.log").write_text(r.stdout + r.stderr, encoding="utf-8")
+    if r.returncode != 0:
+        raise SystemExit(f"[bench] {name} failed (rc={r.returncode}):\n{(r.stdout + r.stderr)[-2000:]}")
+    return elapsed, r.stdout
+
+
+def run_stages(workdir: Path, env: dict, run_id: str) -> dict[str, float]:
+    env = {**env, "TRACE_RUN_ID": run_id, "TRACE_DIR": str(workdir / "traces")}
+    timings: dict[str, float] = {}
+    payload_path = ""
+    for name in STAGES:
+        args = [payload_path] if name == "post_to_slack" else []
+        timings[name], out = run_stage(name, args, workdir, env)
+        if name == "build_slack_payload":
+            payload_path = out.strip().splitlines()[-1]
+    timings["total"] = sum(timings.values())
+    return timings
+
+
+def span_summary(workdir: Path, run_id: str) -> dict:
+    """p50/p95 per span name from the stages' trace (see tracing.py)."""
+    path = workdir / "traces" / f"{run_id}.summary.json"
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))["by_name"]
+
+
+def bench_items(n: int, server: StandIn, args) -> dict:
+    env = stage_env(n, server, args.codex_delay, args.backend)
+    result: dict = {"items": n}
+    with tempfile.TemporaryDirectory(prefix="hn-bench-") as tmp:
+        workdir = Path(tmp)
+        shutil.copy(ROOT / "schema.json", workdir / "schema.json")
+        server.counts.clear()
+        result["cold"] = run_stages(workdir, env, "cold")
+        result["requests"] = dict(server.counts)
+        result["spans"] = span_summary(workdir, "cold")
+        if args.warm:
+            server.counts.clear()
+            result["warm"] = run_stages(workdir, env, "warm")
+            result["warm_requests"] = dict(server.counts)
+            result["warm_spans"] = span_summary(workdir, "warm")
+
+    if args.pipeline:
+        with tempfile.TemporaryDirectory(prefix="hn-bench-") as tmp:
+            workdir = Path(tmp)
+            shutil.copy(ROOT / "schema.json", workdir / "schema.json")
+            elapsed, _ = run_stage("pipeline", [], workdir, env)
+            result["pipeline"] = {"total": elapsed}
+    return result
+
+
+def git_commit() -> str:
+    try:
+        r = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"], cwd=ROOT).returncode != 0
+        return r.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_table(report: dict, baseline: dict | None) -> None:
+    old = {r["items"]: r for r in (baseline or {}).get("results", [])}
+    for r in report["results"]:
+        print(f"\n{r['items']} items" + (f" (vs {baseline['commit']})" if baseline else ""))
+        for run in ("cold", "warm", "pipeline"):
+            if run not in r:
+                continue
+            for stage, sec in r[run].items():
+                line = f"  {run:8s} {stage:20s} {sec:8.3f}s"
+                prev = old.get(r["items"], {}).get(run, {}).get(stage)
+                if prev:
+                    line += f"  {prev:8.3f}s  x{sec / prev:.2f}"
+                print(line)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--items", default="20,100,500", help="comma-separated item counts")
+    ap.add_argument("--latency-ms", type=float, default=50, help="added to every stand-in request")
+    ap.add_argument("--codex-delay", type=float, default=0.05, help="seconds per fake codex call")
+    ap.add_argument("--backend", choices=("codex", "openai"), default="codex", help="SUMMARIZER_BACKEND")
+    ap.add_argument("--warm", action="store_true", help="re-run the stages with warm caches")
+    ap.add_argument("--pipeline", action="store_true", help="also time pipeline.py")
+    ap.add_argument("--out", help="result JSON path")
+    ap.add_argument("--compare", help="earlier result JSON to compare against")
+    args = ap.parse_args()
+
+    server = StandIn(Fixtures(), args.latency_ms / 1000, args.codex_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": {
+            "latency_ms": args.latency_ms,
+            "codex_delay_sec": args.codex_delay,
+            "backend": args.backend,
+            "env": {k: v for k, v in stage_env(0, server, args.codex_delay, args.backend).items()
+                    if k in STAGE_DEFAULTS
+                    or k.startswith(("SUMMARIZE_", "FETCH_", "STATE_", "PACK_", "CODEX_", "FAKE_CODEX_"))},
+        },
+        "results": [],
+    }
+    try:
+        for n in (int(x) for x in args.items.split(",") if x.strip()):
+            print(f"[bench] {n} items...", file=sys.stderr)
+            report["results"].append(bench_items(n, server, args))
+    finally:
+        server.shutdown()
+
+    out = Path(args.out or BENCH / "results" / f"pipeline-{commit}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    baseline = json.loads(Path(args.compare).read_text(encoding="utf-8")) if args.compare else None
+    print_table(report, baseline)
+    print(f"\n[bench] Wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
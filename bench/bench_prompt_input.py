@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Per-item codex latency: temp input file vs. item JSON inlined in the prompt.
+
+Usage:
+  python bench/bench_prompt_input.py [--items 20] [--codex-delay 0.5]
+                                     [--tool-sec 2] [--concurrency 1]
+
+Writes the same fixture items (bench/fixtures/) to data/hn_with_text.jsonl
+in a temporary directory and runs summarize.py once with PROMPT_INPUT=file
+and once with PROMPT_INPUT=inline, against bench/fake_codex.py.
+
+fake_codex.py takes --codex-delay per call, plus --tool-sec whenever it
+has to open the input file: the agent turn a real codex spends on that
+tool call. Its cost depends on the model and account, so measure it (e.g.
+from `codex exec --json` event timestamps) and pass it in. Per-item
+latency comes from the codex spans of each run's trace (see tracing.py).
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import fetch_article_text as fat  # noqa: E402
+from artifacts import write_artifact  # noqa: E402
+from bench_pipeline import FAKE_CODEX, Fixtures  # noqa: E402
+
+MODES = ("file", "inline")
+
+
+def fixture_items(n: int) -> list[dict]:
+    """n stories shaped like pack_input.py output, with article text and comments."""
+    fixtures = Fixtures()
+    text = fat.html_to_text(fixtures.article.decode("utf-8", "replace")).strip()[: fat.MAX_CHARS]
+    items = []
+    for h in fixtures.front_page_hits(n, "https://example.com"):
+        story_id = str(h["objectID"])
+        comments = fat.clean_comment_hits(fixtures.comment_hits(story_id, fat.HN_COMMENTS_MAX))
+        url = h.get("url") or ""
+        items.append({
+            "hn_id": story_id,
+            "title": h.get("title") or "",
+            "url": url,
+            "domain": fat.domain_of(url),
+            "points": h.get("points") or 0,
+            "comments": h.get("num_comments") or 0,
+            "source_text": text if url else "",
+            "body_source": "readability" if url else "no_url",
+            "comment_texts": [c["text"] for c in comments],
+        })
+    return items
+
+
+def run_mode(mode: str, items: list[dict], args) -> dict:
+    with tempfile.TemporaryDirectory(prefix="hn-bench-prompt-") as tmp:
+        workdir = Path(tmp)
+        shutil.copy(ROOT / "schema.json", workdir / "schema.json")
+        write_artifact(
+            workdir / "data" / "hn_with_text.jsonl",
+            {"stage": "pack_input", "date": time.strftime("%Y-%m-%d"), "total": len(items)},
+            items,
+        )
+        env = {
+            **os.environ,
+            "PROMPT_INPUT": mode,
+            "PROMPT_LANG": "en",
+            "PROMPT_FILE": str(ROOT / "prompts" / "en.txt"),
+            "SUMMARIZER_BACKEND": "codex",
+            "CODEX_BIN": str(FAKE_CODEX),
+            "FAKE_CODEX_DELAY_SEC": str(args.codex_delay),
+            "FAKE_CODEX_TOOL_SEC": str(args.tool_sec),
+            "SUMMARIZE_CONCURRENCY": str(args.concurrency),
+            "SUMMARIZE_BATCH_SIZE": "1",
+            "SUMMARY_CACHE": "false",
+            "CODEX_HEDGE": "false",
+            "CODEX_LATENCY_FILE": str(workdir / "codex_latency.json"),
+            "STATE_BACKEND": "json",
+            "POST_EACH": "false",
+            "TRACE": "true",
+            "TRACE_DIR": str(workdir / "traces"),
+            "TRACE_RUN_ID": mode,
+        }
+        start = time.perf_counter()
+        r = subprocess.run(
+            [sys.executable, str(ROOT / "summarize.py")], cwd=workdir, env=env, capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - start
+        if r.returncode != 0:
+            raise SystemExit(f"[bench] summarize ({mode}) failed (rc={r.returncode}):\n{(r.stdout + r.stderr)[-2000:]}")
+        summary = json.loads((workdir / "traces" / f"{mode}.summary.json").read_text(encoding="utf-8"))
+        return {"total": elapsed, "codex": summary["by_name"].get("codex", {})}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--items", type=int, default=20, help="stories to summarize")
+    ap.add_argument("--codex-delay", type=float, default=0.5, help="seconds per fake codex call")
+    ap.add_argument("--tool-sec", type=float, default=2.0, help="seconds per agent tool call (reading the input file)")
+    ap.add_argument("--concurrency", type=int, default=1, help="SUMMARIZE_CONCURRENCY")
+    args = ap.parse_args()
+
+    items = fixture_items(args.items)
+    print(f"[bench] {len(items)} items, codex delay {args.codex_delay}s, tool call {args.tool_sec}s")
+    results = {mode: run_mode(mode, items, args) for mode in MODES}
+
+    print(f"\n  {'mode':8s} {'calls':>6s} {'p50':>8s} {'p95':>8s} {'max':>8s} {'total':>8s}")
+    for mode, res in results.items():
+        c = res["codex"]
+        print(
+            f"  {mode:8s} {c.get('count', 0):6d} {c.get('p50', 0):8.3f} {c.get('p95', 0):8.3f} "
+            f"{c.get('max', 0):8.3f} {res['total']:8.3f}"
+        )
+    file_p50 = results["file"]["codex"].get("p50") or 0
+    if file_p50:
+        print(f"\n  inline / file per-item p50: x{results['inline']['codex'].get('p50', 0) / file_p50:.2f}")
+
+
+if __name__ == "__main__":
+    main()
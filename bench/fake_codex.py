@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Stand-in for the `codex` CLI used by bench/bench_pipeline.py.
+
+Accepts the same arguments summarize.py passes
+(`exec <prompt> --output-schema <schema> -o <out> --full-auto`, or `exec -`
+with the prompt on stdin), sleeps FAKE_CODEX_DELAY_SEC, and writes a
+schema-valid summary for every item of the input file named in the prompt
+or of the input JSON embedded in it (PROMPT_INPUT=inline). Reading an input
+file stands for one agent tool call and adds FAKE_CODEX_TOOL_SEC. FAKE_CODEX_FAIL_RATE makes that share
+of calls exit non-zero, to exercise retries, and FAKE_CODEX_STALL_RATE
+makes that share take FAKE_CODEX_STALL_SEC instead (a stuck call), to
+exercise adaptive timeouts and hedging.
+"""
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import date
+
+FAKE_CODEX_DELAY_SEC = float(os.getenv("FAKE_CODEX_DELAY_SEC", "0.05"))
+FAKE_CODEX_FAIL_RATE = float(os.getenv("FAKE_CODEX_FAIL_RATE", "0"))
+FAKE_CODEX_STALL_RATE = float(os.getenv("FAKE_CODEX_STALL_RATE", "0"))
+FAKE_CODEX_STALL_SEC = float(os.getenv("FAKE_CODEX_STALL_SEC", "30"))
+FAKE_CODEX_TOOL_SEC = float(os.getenv("FAKE_CODEX_TOOL_SEC", "0"))
+
+
+def parse_args(argv: list[str]) -> tuple[str, str]:
+    if len(argv) < 2 or argv[0] != "exec":
+        raise SystemExit("usage: fake_codex.py exec <prompt> --output-schema <path> -o <path>")
+    prompt, out = argv[1], ""
+    for i, a in enumerate(argv):
+        if a == "-o" and i + 1 < len(argv):
+            out = argv[i + 1]
+    if not out:
+        raise SystemExit("fake_codex.py: -o <path> is required")
+    if prompt == "-":
+        prompt = sys.stdin.read()
+    return prompt, out
+
+
+def input_items(prompt: str) -> list[dict]:
+    """Items of the input JSON embedded in the prompt, else of the first input file it names."""
+    decoder = json.JSONDecoder()
+    for m in re.finditer(r"^\{", prompt, re.M):
+        try:
+            data, _ = decoder.raw_decode(prompt, m.start())
+        except ValueError:
+            continue
+        if isinstance(data, dict) and "items" in data:
+            return data["items"]
+    for path in re.findall(r"[\w./-]+\.json", prompt):
+        if os.path.exists(path) and os.path.basename(path) != "schema.json":
+            time.sleep(FAKE_CODEX_TOOL_SEC)
+            with open(path, encoding="utf-8") as f:
+                return json.load(f).get("items", [])
+    raise SystemExit("fake_codex.py: no input file found in prompt")
+
+
+def summary_for(it: dict) -> dict:
+    title = it.get("title") or "(no title)"
+    comments = it.get("comment_texts") or []
+    return {
+        "hn_id": str(it.get("hn_id", "")),
+        "summary": f"{title}. A synthetic summary written by fake_codex.py for benchmarking.",
+        "bullets": [f"Point {i + 1} about {title}" for i in range(5)],
+        "comment_pro": [c[:80] for c in comments[:1]],
+        "comment_con": [c[:80] for c in comments[1:2]],
+        "comment_points": [c[:80] for c in comments[2:3]],
+        "confidence": "medium" if it.get("source_text") else "low",
+        "used_body": bool(it.get("source_text")),
+        "body_source": it.get("body_source") or "",
+    }
+
+
+def main() -> None:
+    prompt, out = parse_args(sys.argv[1:])
+    stalled = random.random() < FAKE_CODEX_STALL_RATE
+    time.sleep(FAKE_CODEX_STALL_SEC if stalled else FAKE_CODEX_DELAY_SEC)
+    if random.random() < FAKE_CODEX_FAIL_RATE:
+        print("fake_codex.py: simulated failure", file=sys.stderr)
+        raise SystemExit(1)
+    m = re.search(r"OUTPUT_LANG=(\w+)", prompt)
+    lang = m.group(1) if m else "en"
+    result = {
+        "date": date.today().isoformat(),
+        "lang": lang,
+        "items": [summary_for(it) for it in input_items(prompt)],
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,20 @@ from datetime import date
 from collections import Counter
 from dotenv import load_dotenv
 
+from artifacts import read_artifact
+from state_store import StateStore, use_sqlite
+from tracing import span
+
 load_dotenv()
 
 HN_TOP_N = int(os.getenv("HN_TOP_N", "20"))
 SLACK_PREFIX = os.getenv("SLACK_PREFIX", "").strip()
 SLACK_MSG_LIMIT = int(os.getenv("SLACK_MSG_LIMIT", "3500"))
+# greedy: fill messages in order; optimal: fewest messages via DP, evenly sized
+SLACK_SPLIT_MODE = os.getenv("SLACK_SPLIT_MODE", "greedy").strip()
+# Item blocks longer than a message: split (at line breaks) | truncate | none
+SLACK_OVERSIZE = os.getenv("SLACK_OVERSIZE", "split").strip()
+PROMPT_LANG = os.getenv("PROMPT_LANG", "en")
 
 def md_link(text: str, url: str) -> str:
     if not url:
@@ -32,6 +41,8 @@ def labels(lang: str):
             "pro": "Pro",
             "con": "Con",
             "points": "Points",
+            "related": "Related",
+            "earlier": "related to an earlier story",
             "note": "Note: comment summaries are based on fetched HN comments (up to HN_COMMENTS_MAX). If article body is unavailable, summaries rely on metadata.",
             "continued": "_(Hacker News Digest continued)_",
         }
@@ -41,12 +52,31 @@ def labels(lang: str):
         "pro": "賛成",
         "con": "反対",
         "points": "論点",
+        "related": "関連",
+        "earlier": "以前の記事の関連",
         "note": "注: コメント要約は取得できたコメント（最大HN_COMMENTS_MAX件）からの要約です。本文未取得の記事はメタ情報ベースになります。",
         "continued": "_(Hacker News Digest 続き)_",
     }
 
 
-def format_item(idx: int, it: dict, s: dict | None, L: dict) -> str:
+def fmt_related(related: list[dict], L: dict) -> list[str]:
+    """Duplicate stories (dedup.py) as links under their representative."""
+    if not related:
+        return []
+    out = [f"   *{L['related']}*"]
+    for r in related:
+        title = r.get("title", "") or "(no title)"
+        out.append(f"   • {md_link(title, r.get('url', ''))}  _▲{r.get('points')} / 💬{r.get('comments')}_")
+    return out
+
+
+def format_related_item(it: dict, L: dict) -> str:
+    """A duplicate story whose representative went out earlier (daemon digest, POST_EACH)."""
+    title = it.get("title", "") or "(no title)"
+    return f"• {md_link(title, it.get('url', ''))}  _▲{it.get('points')} / 💬{it.get('comments')}_  _({L['earlier']})_\n"
+
+
+def format_item(idx: int, it: dict, s: dict | None, L: dict, related: list[dict] | None = None) -> str:
     """Format a single HN item as Slack mrkdwn text."""
     title = it.get("title", "") or "(no title)"
     url = it.get("url", "")
@@ -56,7 +86,7 @@ def format_item(idx: int, it: dict, s: dict | None, L: dict) -> str:
     meta = f"▲{pts} / 💬{com} / {domain}"
 
     if not s:
-        return f"{idx}. {md_link(title, url)}  _{meta}_\n"
+        return "\n".join([f"{idx}. {md_link(title, url)}  _{meta}_"] + fmt_related(related or [], L)) + "\n"
 
     used = "body" if s.get("used_body") else "meta"
     conf = s.get("confidence", "")
@@ -84,10 +114,37 @@ def format_item(idx: int, it: dict, s: dict | None, L: dict) -> str:
         lines += fmt_section(L["con"], con, max_n=3)
         lines += fmt_section(L["points"], pts2, max_n=3)
 
+    lines += fmt_related(related or [], L)
     lines.append("")
     return "\n".join(lines)
 
 
+def fit_block(block: str, cap: int, mode: str = SLACK_OVERSIZE) -> list[str]:
+    """Make an item block fit in cap chars: split at line boundaries, truncate, or leave it."""
+    if len(block) <= cap or mode == "none":
+        return [block]
+    if mode == "truncate":
+        return [block[: cap - 1] + "…"]
+    chunks: list[str] = []
+    cur: list[str] = []
+    cur_len = 0
+    for line in block.split("\n"):
+        while len(line) > cap:
+            if cur:
+                chunks.append("\n".join(cur))
+                cur, cur_len = [], 0
+            chunks.append(line[:cap])
+            line = line[cap:]
+        if cur and cur_len + 1 + len(line) > cap:
+            chunks.append("\n".join(cur))
+            cur, cur_len = [], 0
+        cur_len += len(line) + (1 if cur else 0)
+        cur.append(line)
+    if cur:
+        chunks.append("\n".join(cur))
+    return chunks
+
+
 def split_into_payloads(
     header: str,
     body_source_line: str,
@@ -95,73 +152,142 @@ def split_into_payloads(
     footer: str,
     continued_header: str,
     limit: int = SLACK_MSG_LIMIT,
+    mode: str = SLACK_SPLIT_MODE,
 ) -> list[dict]:
-    """Split formatted items into multiple Slack payloads at item boundaries."""
-    payloads: list[dict] = []
-    current_lines: list[str] = []
-    is_first = True
-
-    def current_len() -> int:
-        return len("\n".join(current_lines))
-
-    def flush():
-        nonlocal current_lines, is_first
-        if not current_lines:
-            return
-        # Append footer to last payload (added later in main)
-        payloads.append({"text": "\n".join(current_lines)})
-        current_lines = []
-        is_first = False
-
-    # Start first message with header
-    current_lines.append(header)
-    if body_source_line:
-        current_lines.append("")
-        current_lines.append(body_source_line)
-    current_lines.append("")
-
-    for block in item_blocks:
-        # Check if adding this block would exceed the limit
-        tentative = current_len() + len("\n") + len(block)
-        if tentative > limit and current_lines:
-            flush()
-            # Start continuation message
-            current_lines.append(continued_header)
-            current_lines.append("")
-
-        current_lines.append(block)
-
-    # Append footer to whatever is in the buffer
-    current_lines.append(footer)
-    flush()
+    """Split formatted items into multiple Slack payloads at item boundaries.
+
+    mode="greedy" fills each message in turn; mode="optimal" picks the
+    order-preserving split with the fewest messages (ties: most even sizes).
+    Blocks too large for any message are handled per SLACK_OVERSIZE first.
+    """
+    first_prefix = [header] + (["", body_source_line] if body_source_line else []) + [""]
+    cont_prefix = [continued_header, ""]
+    # Message text is "\n".join(prefix + blocks [+ footer]); each appended line costs len + 1.
+    first_len = len("\n".join(first_prefix))
+    cont_len = len("\n".join(cont_prefix))
+    footer_len = len(footer) + 1
+
+    cap = limit - max(first_len, cont_len) - footer_len - 1
+    blocks = [chunk for block in item_blocks for chunk in fit_block(block, max(cap, 1))]
+    sizes = [len(b) + 1 for b in blocks]
+
+    if mode == "optimal":
+        ranges = _optimal_ranges(sizes, first_len, cont_len, footer_len, limit)
+    else:
+        ranges = _greedy_ranges(sizes, first_len, cont_len, footer_len, limit)
 
+    payloads: list[dict] = []
+    for k, (i, j) in enumerate(ranges):
+        lines = (first_prefix if k == 0 else cont_prefix) + blocks[i:j]
+        if k == len(ranges) - 1:
+            lines.append(footer)
+        payloads.append({"text": "\n".join(lines)})
     return payloads
 
 
-def main() -> None:
-    with open("data/hn_with_text.json", encoding="utf-8") as f:
-        hn = json.load(f)
-    with open("data/summaries.json", encoding="utf-8") as f:
-        sm = json.load(f)
+def _greedy_ranges(
+    sizes: list[int], first_len: int, cont_len: int, footer_len: int, limit: int
+) -> list[tuple[int, int]]:
+    ranges: list[tuple[int, int]] = []
+    start, cur = 0, first_len
+    for j, size in enumerate(sizes):
+        if cur + size > limit and j > start:
+            ranges.append((start, j))
+            start, cur = j, cont_len
+        cur += size
+    if cur + footer_len > limit and len(sizes) > start:
+        ranges.append((start, len(sizes)))
+        # Footer goes alone into a final continuation message
+        start = len(sizes)
+    ranges.append((start, len(sizes)))
+    return ranges
+
+
+def _optimal_ranges(
+    sizes: list[int], first_len: int, cont_len: int, footer_len: int, limit: int
+) -> list[tuple[int, int]]:
+    """DP over item boundaries: fewest messages, then smallest largest message."""
+    n = len(sizes)
+    prefix = [0]
+    for size in sizes:
+        prefix.append(prefix[-1] + size)
+
+    def length(i: int, j: int) -> int:
+        base = first_len if i == 0 else cont_len
+        return base + prefix[j] - prefix[i] + (footer_len if j == n else 0)
+
+    # best[j] = (messages, largest message, previous boundary) covering blocks[:j]
+    best: list[tuple[int, int, int] | None] = [None] * (n + 1)
+    best[0] = (0, 0, -1)
+    for j in range(1, n + 1):
+        for i in range(j - 1, -1, -1):
+            if best[i] is None:
+                continue
+            ln = length(i, j)
+            if ln > limit and j - i > 1:
+                break  # longer ranges ending at j only grow
+            cand = (best[i][0] + 1, max(best[i][1], ln), i)
+            if best[j] is None or cand[:2] < best[j][:2]:
+                best[j] = cand
+
+    if n == 0:
+        return [(0, 0)]
+    ranges: list[tuple[int, int]] = []
+    j = n
+    while j > 0:
+        i = best[j][2]
+        ranges.append((i, j))
+        j = i
+    return ranges[::-1]
+
+
+def build_payloads(
+    hn: dict,
+    sm: dict,
+    top_n: int = HN_TOP_N,
+    prefix: str = SLACK_PREFIX,
+    limit: int = SLACK_MSG_LIMIT,
+    mode: str = SLACK_SPLIT_MODE,
+) -> tuple[list[dict], str]:
+    """Render hn_with_text + summaries into Slack payloads. Returns (payloads, date).
 
+    The keyword arguments default to the .env settings; fanout.py passes
+    each target's own.
+    """
     lang = sm.get("lang", "ja")
     L = labels(lang)
 
     sm_by_id = {x["hn_id"]: x for x in sm["items"]}
 
     today = hn.get("date") or date.today().isoformat()
-    header = f"{SLACK_PREFIX}\n*{L['digest']}* ({today})  {L['top']}{HN_TOP_N}"
+    if not hn.get("items"):
+        # e.g. HN_DELTA=true and nothing changed: post nothing
+        return [], today
+    header = f"{prefix}\n*{L['digest']}* ({today})  {L['top']}{top_n}"
 
     body_sources = Counter(i.get("body_source") for i in hn.get("items", []))
     body_source_line = ""
     if body_sources:
         body_source_line = f"_body_source: {dict(body_sources)}_"
 
+    shown = {str(it.get("hn_id", "")) for it in hn["items"] if not it.get("duplicate_of")}
+    related: dict[str, list[dict]] = {}
+    for it in hn["items"]:
+        if it.get("duplicate_of"):
+            related.setdefault(str(it["duplicate_of"]), []).append(it)
+
     item_blocks: list[str] = []
-    for idx, it in enumerate(hn["items"], start=1):
+    idx = 0
+    for it in hn["items"]:
+        if it.get("duplicate_of"):
+            if str(it["duplicate_of"]) not in shown:
+                # Its representative was in an earlier digest (daemon.py's long-lived Deduper)
+                item_blocks.append(format_related_item(it, L))
+            continue
+        idx += 1
         sid = str(it.get("hn_id", ""))
         s = sm_by_id.get(sid)
-        item_blocks.append(format_item(idx, it, s, L))
+        item_blocks.append(format_item(idx, it, s, L, related.get(sid)))
 
     footer = f"_{L['note']}_"
 
@@ -171,13 +297,56 @@ def main() -> None:
         item_blocks=item_blocks,
         footer=footer,
         continued_header=L["continued"],
+        limit=limit,
+        mode=mode,
     )
+    return payloads, today
+
+
+def _stories_path(payload_path: str) -> str:
+    return payload_path.removesuffix(".json") + ".stories.json"
+
 
+def write_payloads(payloads: list[dict], today: str, name: str = "", stories: list[dict] | None = None) -> str:
+    """Write payloads to out/; stories (the rendered items) go alongside for read_payload_stories."""
     os.makedirs("out", exist_ok=True)
-    out_path = f"out/slack_payload_{today}.json"
+    out_path = f"out/slack_payload_{today}{'_' + name if name else ''}.json"
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(payloads, f, ensure_ascii=False, indent=2)
-    print(out_path)
+    if stories is not None:
+        keep = ("hn_id", "points", "comments")
+        with open(_stories_path(out_path), "w", encoding="utf-8") as f:
+            json.dump([{k: it.get(k) for k in keep} for it in stories], f, ensure_ascii=False)
+    return out_path
+
+
+def read_payload_stories(payload_path: str) -> list[dict]:
+    """Stories rendered into a payload file by write_payloads ([] if it wasn't given any)."""
+    try:
+        with open(_stories_path(payload_path), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def main() -> None:
+    if use_sqlite():
+        store = StateStore()
+        hn = store.load_run()
+        sm = store.load_summaries(hn["date"], "ja" if "ja" in PROMPT_LANG else "en")
+    else:
+        header, records = read_artifact("data/hn_with_text.jsonl")
+        # Only the metadata is rendered; article / comment text is dropped while reading
+        hn = {
+            "date": header.get("date", ""),
+            "items": [{k: v for k, v in it.items() if k not in ("source_text", "comment_texts")} for it in records],
+        }
+        header, records = read_artifact("data/summaries.jsonl")
+        sm = {"date": header.get("date", ""), "lang": header.get("lang", ""), "items": list(records)}
+
+    payloads, today = build_payloads(hn, sm)
+    print(write_payloads(payloads, today, stories=hn["items"]))
 
 if __name__ == "__main__":
-    main()
+    with span("stage", stage="build_slack_payload"):
+        main()
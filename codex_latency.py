@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Persistent latency record of codex exec calls, for adaptive timeouts.
+
+Every successful call (and every timed-out one, see below) stores
+(input bytes, seconds) in CODEX_LATENCY_FILE (most recent
+CODEX_LATENCY_SAMPLES kept). Percentiles for a new call come
+from past calls of the same input size class (power of two) once there
+are CODEX_LATENCY_MIN_SAMPLES of them; otherwise from all calls, each
+scaled up linearly if the new input is larger.
+
+summarize.py derives from them:
+- the attempt timeout: p99 x CODEX_TIMEOUT_FACTOR, between CODEX_TIMEOUT_MIN
+  and CODEX_TIMEOUT (the fixed budget used until enough calls were seen).
+  Timed-out calls are recorded at their timeout (a lower bound), so a
+  slowdown raises the timeout instead of failing every call at the old
+  one; the last retry of an item always gets the full CODEX_TIMEOUT;
+- the hedge delay: an attempt still running after p95 gets a second,
+  concurrent attempt (CODEX_HEDGE) and the first valid result wins. A
+  winning hedge is recorded at the time since the original attempt
+  started (again a lower bound), not its own shorter run.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from tracing import percentile
+
+load_dotenv()
+
+CODEX_LATENCY_FILE = Path(os.getenv("CODEX_LATENCY_FILE", "data/codex_latency.json"))
+CODEX_LATENCY_SAMPLES = int(os.getenv("CODEX_LATENCY_SAMPLES", "500"))
+CODEX_LATENCY_MIN_SAMPLES = int(os.getenv("CODEX_LATENCY_MIN_SAMPLES", "20"))
+CODEX_TIMEOUT_FACTOR = float(os.getenv("CODEX_TIMEOUT_FACTOR", "2"))
+CODEX_TIMEOUT_MIN = float(os.getenv("CODEX_TIMEOUT_MIN", "30"))
+
+
+def size_class(size: int) -> int:
+    return max(0, size).bit_length()
+
+
+class LatencyStats:
+    def __init__(self, path: Path = CODEX_LATENCY_FILE):
+        self.path = path
+        self.samples: list[list[float]] = []  # [input bytes, seconds], oldest first
+        self.lock = threading.Lock()
+        self.dirty = False
+        if path.exists():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.samples = json.load(f).get("samples", [])
+            except Exception:
+                self.samples = []
+
+    def record(self, size: int, seconds: float) -> None:
+        with self.lock:
+            self.samples.append([size, round(seconds, 3)])
+            del self.samples[:-CODEX_LATENCY_SAMPLES]
+            self.dirty = True
+
+    def quantile(self, q: float, size: int) -> float | None:
+        """Expected q-quantile latency for an input of size bytes, or None without enough data."""
+        with self.lock:
+            samples = list(self.samples)
+        if len(samples) < CODEX_LATENCY_MIN_SAMPLES:
+            return None
+        cls = size_class(size)
+        same = [sec for s, sec in samples if size_class(int(s)) == cls]
+        if len(same) >= CODEX_LATENCY_MIN_SAMPLES:
+            return percentile(sorted(same), q)
+        return percentile(sorted(sec * max(1.0, size / max(1, s)) for s, sec in samples), q)
+
+    def timeout(self, size: int, cap: float) -> float:
+        p99 = self.quantile(0.99, size)
+        if p99 is None:
+            return cap
+        return min(cap, max(CODEX_TIMEOUT_MIN, p99 * CODEX_TIMEOUT_FACTOR))
+
+    def hedge_delay(self, size: int) -> float | None:
+        return self.quantile(0.95, size)
+
+    def save(self) -> None:
+        with self.lock:
+            if not self.dirty:
+                return
+            samples = list(self.samples)
+            self.dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"samples": samples}, f)
+        os.replace(tmp, self.path)
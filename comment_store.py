@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Persistent per-story HN comment store.
+
+Keeps the cleaned plain text of every comment already fetched for a story,
+plus the newest created_at seen, so later runs only ask Algolia for
+comments newer than that (numericFilters=created_at_i>...). HTML is parsed
+once, when a comment first arrives.
+
+Stories not refreshed for COMMENT_STORE_MAX_AGE_DAYS are dropped on save.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COMMENT_STORE = os.getenv("COMMENT_STORE", "true").lower() in ("1", "true", "yes")
+COMMENT_STORE_FILE = Path(os.getenv("COMMENT_STORE_FILE", "data/comment_store.json"))
+# Don't poll Algolia again for a story checked less than this long ago
+COMMENT_STORE_REFRESH_SEC = int(os.getenv("COMMENT_STORE_REFRESH_SEC", "900"))
+COMMENT_STORE_MAX_AGE_DAYS = float(os.getenv("COMMENT_STORE_MAX_AGE_DAYS", "7"))
+
+
+class CommentStore:
+    def __init__(self, path: Path = COMMENT_STORE_FILE):
+        self.path = path
+        self.stories: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        if path.exists():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.stories = json.load(f).get("stories", {})
+            except Exception:
+                self.stories = {}
+
+    def last_created_at(self, story_id: str) -> int | None:
+        """Newest comment timestamp seen for story_id, or None if never fetched."""
+        entry = self.stories.get(story_id)
+        return entry["last_created_at"] if entry else None
+
+    def due(self, story_id: str) -> bool:
+        entry = self.stories.get(story_id)
+        return not entry or time.time() - entry["polled_at"] >= COMMENT_STORE_REFRESH_SEC
+
+    def add(self, story_id: str, comments: list[dict]) -> int:
+        """Append cleaned comments ({id, created_at, text}); returns how many were new."""
+        with self.lock:
+            entry = self.stories.setdefault(
+                story_id, {"last_created_at": 0, "polled_at": 0, "comments": []}
+            )
+            seen = {c["id"] for c in entry["comments"]}
+            added = 0
+            for c in comments:
+                if c["id"] in seen:
+                    continue
+                seen.add(c["id"])
+                entry["comments"].append(c)
+                entry["last_created_at"] = max(entry["last_created_at"], c["created_at"])
+                added += 1
+            entry["polled_at"] = time.time()
+            return added
+
+    def texts(self, story_id: str, max_n: int) -> list[str]:
+        """Up to max_n comment texts: the earliest-stored half, then the newest.
+
+        The first batch of a story is stored in Algolia relevance order, so
+        the head keeps the most relevant comments while the tail lets new
+        discussion show up on later runs. Later batches arrive newest first
+        (/search_by_date), so the tail is picked by created_at.
+        """
+        comments = self.stories.get(story_id, {}).get("comments", [])
+        if len(comments) <= max_n:
+            chosen = comments
+        else:
+            head = (max_n + 1) // 2
+            rest = sorted(comments[head:], key=lambda c: c["created_at"])
+            chosen = comments[:head] + rest[len(rest) - (max_n - head):]
+        return [c["text"] for c in chosen]
+
+    def save(self) -> None:
+        cutoff = time.time() - COMMENT_STORE_MAX_AGE_DAYS * 86400
+        with self.lock:
+            self.stories = {k: v for k, v in self.stories.items() if v["polled_at"] >= cutoff}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"stories": self.stories}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
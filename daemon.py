@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""Resident scheduler: poll the front page and post digests from one process.
+
+Instead of launchd starting run.sh (and re-importing every module and
+re-opening every connection) for each run, `python daemon.py` stays up:
+
+- every DAEMON_POLL_SEC it fetches the front page in delta mode, so only
+  new stories or ones that gained HN_DELTA_MIN_POINTS / HN_DELTA_MIN_COMMENTS
+  since they were last processed are picked up;
+- those are fetched and summarized at once, with the HTTP session, HTTP
+  cache, comment store, dedup index, domain health and summary cache kept
+  in memory;
+- summaries are queued and posted as one digest at DAEMON_DIGEST_TIMES
+  (local HH:MM, comma separated) or as soon as DAEMON_DIGEST_MIN_ITEMS
+  stories are queued (0 disables the threshold).
+
+Stories awaiting processing and the digest queue are kept in
+DAEMON_STATE_FILE, written after every step. SIGTERM / SIGINT let the
+current summaries finish, stop taking new stories and save the state, so
+a restarted daemon resumes where it stopped (an interrupted digest post
+resumes through the Slack delivery ledger). Each poll is traced as its own
+run (see tracing.py).
+"""
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import build_slack_payload  # noqa: E402
+import fetch_article_text  # noqa: E402
+import fetch_hn  # noqa: E402
+import pack_input  # noqa: E402
+import post_to_slack  # noqa: E402
+import summarize  # noqa: E402
+import tracing  # noqa: E402
+from comment_store import COMMENT_STORE, CommentStore  # noqa: E402
+from dedup import DEDUP, Deduper  # noqa: E402
+from domain_health import DOMAIN_HEALTH, DomainHealth  # noqa: E402
+from http_cache import HTTP_CACHE, HttpCache  # noqa: E402
+from summary_cache import SUMMARY_CACHE, SummaryCache  # noqa: E402
+from tracing import span  # noqa: E402
+
+DAEMON_POLL_SEC = max(10, int(os.getenv("DAEMON_POLL_SEC", "900")))
+DAEMON_DIGEST_TIMES = [
+    tuple(int(x) for x in t.strip().split(":"))
+    for t in os.getenv("DAEMON_DIGEST_TIMES", "07:30").split(",")
+    if t.strip()
+]
+DAEMON_DIGEST_MIN_ITEMS = int(os.getenv("DAEMON_DIGEST_MIN_ITEMS", "0"))
+DAEMON_STATE_FILE = os.getenv("DAEMON_STATE_FILE", "data/daemon_state.json")
+
+# Large fields are re-fetched (pending) or no longer needed (queued)
+_HEAVY_FIELDS = ("source_text", "comment_texts")
+
+
+def _slim(it: dict) -> dict:
+    return {k: v for k, v in it.items() if k not in _HEAVY_FIELDS}
+
+
+def _slot_times(now: float) -> list[float]:
+    """DAEMON_DIGEST_TIMES yesterday, today and tomorrow as timestamps."""
+    lt = time.localtime(now)
+    return sorted(
+        time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday + day, hh, mm, 0, 0, 0, -1))
+        for day in (-1, 0, 1)
+        for hh, mm in DAEMON_DIGEST_TIMES
+    )
+
+
+def last_slot(now: float) -> float:
+    """Latest scheduled digest time at or before now (0 if none are configured)."""
+    return max((t for t in _slot_times(now) if t <= now), default=0.0)
+
+
+def next_slot(now: float) -> float:
+    """Next scheduled digest time after now (inf if none are configured)."""
+    return min((t for t in _slot_times(now) if t > now), default=float("inf"))
+
+
+def load_state() -> dict:
+    state = {"pending": [], "queue": [], "last_digest": time.time(), "digest_key": None}
+    if os.path.exists(DAEMON_STATE_FILE):
+        with open(DAEMON_STATE_FILE, encoding="utf-8") as f:
+            state.update(json.load(f))
+    return state
+
+
+def save_state(state: dict) -> None:
+    os.makedirs(os.path.dirname(DAEMON_STATE_FILE) or ".", exist_ok=True)
+    tmp = DAEMON_STATE_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(
+            {**state, "pending": [_slim(it) for it in state["pending"]]},
+            f,
+            ensure_ascii=False,
+        )
+    os.replace(tmp, DAEMON_STATE_FILE)
+
+
+class Daemon:
+    def __init__(self):
+        self.stop = threading.Event()
+        self.state = load_state()
+        self.lang = "ja" if "ja" in summarize.PROMPT_LANG else "en"
+        # Warm for the life of the process; saved after every poll
+        self.http_cache = HttpCache() if HTTP_CACHE else None
+        self.comments = CommentStore() if COMMENT_STORE else None
+        self.deduper = Deduper() if DEDUP else None
+        self.health = DomainHealth() if DOMAIN_HEALTH else None
+        self.summaries = (
+            SummaryCache(summarize.load_prompt(), summarize.SCHEMA_FILE.read_text(encoding="utf-8"))
+            if SUMMARY_CACHE
+            else None
+        )
+
+    def request_stop(self, signum, frame) -> None:
+        print(f"[daemon] {signal.Signals(signum).name}: finishing in-flight summaries, then exiting", flush=True)
+        self.stop.set()
+
+    # ---- bookkeeping ----
+
+    def _unpend(self, it: dict) -> None:
+        hn_id = str(it.get("hn_id", ""))
+        self.state["pending"] = [p for p in self.state["pending"] if str(p.get("hn_id", "")) != hn_id]
+
+    def _enqueue(self, it: dict, summary: dict | None) -> None:
+        self._unpend(it)
+        hn_id = str(it.get("hn_id", ""))
+        # A story that changed again replaces its queued version
+        queue = [e for e in self.state["queue"] if str(e["item"].get("hn_id", "")) != hn_id]
+        queue.append({"item": _slim(it), "summary": summary})
+        self.state["queue"] = queue
+
+    def queued_stories(self) -> int:
+        return sum(1 for e in self.state["queue"] if not e["item"].get("duplicate_of"))
+
+    # ---- work ----
+
+    def poll(self) -> None:
+        with span("stage", stage="fetch_hn"):
+            try:
+                hn = fetch_hn.fetch_front_page(delta_only=True, use_cache_on_error=False)
+            except Exception as e:
+                print(f"[daemon] [WARN] front page fetch failed ({type(e).__name__}: {e}); retrying next poll")
+                return
+        known = {str(p.get("hn_id", "")) for p in self.state["pending"]}
+        self.state["pending"] += [it for it in hn["items"] if str(it.get("hn_id", "")) not in known]
+        # Persisted before processing; a story stays in the delta until process() queues or posts it
+        save_state(self.state)
+
+    def process(self) -> None:
+        """Fetch and summarize pending stories into the digest queue."""
+        items = list(self.state["pending"])
+        if not items:
+            return
+        date_str = date.today().isoformat()
+        total = len(items)
+        emitted: list[dict] = []
+        numbers: dict[str, int] = {}
+
+        def fetched():
+            for it in fetch_article_text.iter_fetched_items(
+                items, self.http_cache, self.comments, self.deduper, health=self.health
+            ):
+                if self.stop.is_set():
+                    return  # the rest stays pending
+                pack_input.pack_item(it)
+                yield it
+
+        print(f"[daemon] Fetch + summarize {total} new or changed stories...")
+        with span("stage", stage="fetch+summarize"):
+            results = summarize.summarize_items(
+                summarize.story_numbers(fetched(), numbers), {"date": date_str}, total, self.summaries, self.stop
+            )
+            for num, it, result in results:
+                summary = result["items"][0] if result and result.get("items") else None
+                dup = it.get("duplicate_of")
+                if not summary and not dup and self.stop.is_set():
+                    continue  # not started before the stop; stays pending
+                if not summary and not dup:
+                    print(f"  -> SKIPPED {num}/{total} (all retries failed)", file=sys.stderr)
+                    self._unpend(it)
+                elif summarize.POST_EACH:
+                    story = numbers.get(str(it.get("hn_id", "")), 0)
+                    if summarize.post_item_to_slack(it, summary, story, total, date_str):
+                        emitted.append(it)
+                    self._unpend(it)
+                else:
+                    # A duplicate is shown as a related link (or on its own if its story went out earlier)
+                    self._enqueue(it, summary)
+                    emitted.append(it)
+                save_state(self.state)
+                # After the queue is persisted, so a crash in between re-polls the story
+                fetch_hn.mark_emitted(emitted)
+                emitted.clear()
+
+    def digest_due(self, now: float) -> bool:
+        if self.state.get("digest_key"):
+            return True  # an interrupted post resumes first
+        if last_slot(now) > self.state["last_digest"]:
+            return True
+        return DAEMON_DIGEST_MIN_ITEMS > 0 and self.queued_stories() >= DAEMON_DIGEST_MIN_ITEMS
+
+    def emit(self) -> None:
+        """Post the queued stories as one digest and clear the queue."""
+        if not self.queued_stories():
+            self.state.update(queue=[], digest_key=None, last_digest=time.time())
+            save_state(self.state)
+            return
+        # Fixed before the first message, so a retry resumes via the ledger
+        key = self.state.get("digest_key") or time.strftime("%Y%m%d-%H%M%S")
+        self.state["digest_key"] = key
+        save_state(self.state)
+
+        queue = self.state["queue"]
+        hn = {"date": date.today().isoformat(), "items": [e["item"] for e in queue]}
+        sm = {"lang": self.lang, "items": [e["summary"] for e in queue if e["summary"]]}
+        with span("stage", stage="build_slack_payload"):
+            payloads, today = build_slack_payload.build_payloads(hn, sm)
+        print(f"[daemon] Digest of {self.queued_stories()} stories -> {build_slack_payload.write_payloads(payloads, today)}")
+
+        if not post_to_slack.WEBHOOK:
+            print("SLACK_WEBHOOK_URL is not set. Skipping post.", file=sys.stderr)
+        else:
+            try:
+                with span("stage", stage="post_to_slack"):
+                    post_to_slack.post_payloads(payloads, run_key=f"daemon_{key}")
+            except post_to_slack.SlackDeliveryError as e:
+                print(f"[daemon] {e}; retrying next poll", file=sys.stderr)
+                return
+        self.state.update(queue=[], digest_key=None, last_digest=time.time())
+        save_state(self.state)
+
+    def save_caches(self) -> None:
+        for c in (self.http_cache, self.comments, self.health, self.summaries):
+            if c is not None:
+                c.save()
+
+    def run(self) -> None:
+        times = ",".join(f"{h:02d}:{m:02d}" for h, m in DAEMON_DIGEST_TIMES) or "-"
+        print(
+            f"[daemon] pid={os.getpid()} poll={DAEMON_POLL_SEC}s digest_times={times} "
+            f"min_items={DAEMON_DIGEST_MIN_ITEMS or '-'} pending={len(self.state['pending'])} "
+            f"queued={self.queued_stories()}",
+            flush=True,
+        )
+        next_poll = 0.0
+        while not self.stop.is_set():
+            now = time.time()
+            tracing.start_run()
+            if now >= next_poll:
+                next_poll = now + DAEMON_POLL_SEC
+                self.poll()
+                if not self.stop.is_set():
+                    self.process()
+                self.save_caches()
+            if not self.stop.is_set() and self.digest_due(time.time()):
+                self.emit()
+            sys.stdout.flush()
+            self.stop.wait(max(0.0, min(next_poll, next_slot(time.time())) - time.time()))
+
+        self.save_caches()
+        save_state(self.state)
+        print(
+            f"[daemon] Stopped; pending={len(self.state['pending'])} queued={self.queued_stories()} "
+            f"saved to {DAEMON_STATE_FILE}",
+            flush=True,
+        )
+
+
+def main() -> None:
+    d = Daemon()
+    signal.signal(signal.SIGTERM, d.request_stop)
+    signal.signal(signal.SIGINT, d.request_stop)
+    d.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Story deduplication: canonical URLs and near-duplicate article text.
+
+The front page often carries the same article under several URLs
+(tracking parameters, www./m./amp. hosts, AMP paths, Google AMP cache) or
+several stories whose extracted text is practically identical (mirrors,
+syndicated copies). The first (highest-ranked) story of each cluster is
+the representative; the others get duplicate_of=<representative hn_id>
+and dup_reason (url | canonical | text), are not summarized, and are
+shown under the representative in the digest as related links.
+
+Two passes: fetch_hn.py clusters by canonicalized story URL, and
+fetch_article_text.py additionally uses <link rel=canonical> and a 64-bit
+SimHash of source_text (Hamming distance <= DEDUP_SIMHASH_DISTANCE). Only
+full article bodies (body_source=readability) are fingerprinted: an
+og:description is too short and too generic to tell articles apart.
+"""
+import hashlib
+import os
+import re
+from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEDUP = os.getenv("DEDUP", "true").lower() in ("1", "true", "yes")
+# Unrelated texts differ in ~32 of 64 bits; a few edited sentences move a text by ~5-8
+DEDUP_SIMHASH_DISTANCE = int(os.getenv("DEDUP_SIMHASH_DISTANCE", "7"))
+# Texts with fewer words are too short for a meaningful fingerprint
+DEDUP_MIN_WORDS = int(os.getenv("DEDUP_MIN_WORDS", "150"))
+# Stories a long-lived Deduper (daemon.py) remembers; the oldest are forgotten first
+DEDUP_MAX_STORIES = max(1, int(os.getenv("DEDUP_MAX_STORIES", "2000")))
+
+# Click / campaign trackers only: generic names like ref or si select content
+# on some sites (e.g. GitHub's ?ref=<branch>)
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "_hsenc", "_hsmi", "ref_src", "ref_url", "cmpid", "ocid", "spm", "amp",
+} | {p.strip().lower() for p in os.getenv("DEDUP_STRIP_PARAMS", "").split(",") if p.strip()}
+_HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+_WORD = re.compile(r"\w+")
+
+
+def canonical_url(url: str, base: str = "") -> str:
+    """Normalize url for comparison: https, bare host, no tracking params / AMP / fragment."""
+    if not url:
+        return ""
+    if base:
+        url = urljoin(base, url)
+    u = urlparse(url.strip())
+    if u.scheme not in ("http", "https") or not u.hostname:
+        return url.strip()
+    host = u.hostname.lower()
+    path = u.path or "/"
+    # Google AMP cache: https://www.google.com/amp/s/example.com/x -> https://example.com/x
+    if host.endswith("google.com") and path.startswith("/amp/"):
+        rest = path[len("/amp/"):]
+        rest = rest[2:] if rest.startswith("s/") else rest
+        return canonical_url("https://" + rest)
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix) and host.count(".") > 1:
+            host = host[len(prefix):]
+    if u.port and u.port not in (80, 443):
+        host = f"{host}:{u.port}"
+    path = re.sub(r"/amp/?$|\.amp$", "", path) or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    query = sorted(
+        (k, v) for k, v in parse_qsl(u.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    return urlunparse(("https", host, path, "", urlencode(query), ""))
+
+
+def simhash(text: str) -> int | None:
+    """64-bit SimHash over word 3-shingles, or None for texts under DEDUP_MIN_WORDS words."""
+    words = _WORD.findall(text.lower())
+    if len(words) < DEDUP_MIN_WORDS:
+        return None
+    counts = [0] * 64
+    for i in range(len(words) - 2):
+        h = int.from_bytes(hashlib.blake2b(" ".join(words[i:i + 3]).encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            counts[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if counts[bit] > 0)
+
+
+class Deduper:
+    """Assigns stories, in rank order, to the first story they duplicate.
+
+    Fingerprints are split into DEDUP_SIMHASH_DISTANCE + 1 bands; two hashes
+    within that distance agree on at least one band (pigeonhole), so only
+    stories sharing a band are compared. Past max_stories representatives
+    the one registered longest ago is forgotten.
+    """
+
+    def __init__(self, distance: int = DEDUP_SIMHASH_DISTANCE, max_stories: int = DEDUP_MAX_STORIES):
+        self.distance = distance
+        self.bands = distance + 1
+        self.width = 64 // self.bands
+        self.max_stories = max_stories
+        self.by_url: dict[str, str] = {}
+        self.by_band: dict[tuple[int, int], list[tuple[int, str]]] = {}
+        # hn_id -> (canonical urls, simhash) of each representative, oldest first
+        self.stories: dict[str, tuple[list[str], int | None]] = {}
+
+    def _bands(self, h: int) -> list[tuple[int, int]]:
+        mask = (1 << self.width) - 1
+        return [(b, h >> (b * self.width) & mask) for b in range(self.bands)]
+
+    def check(self, it: dict, h: int | None) -> tuple[str, str] | None:
+        """(representative hn_id, reason) if it duplicates an earlier story; h = simhash."""
+        hn_id = str(it.get("hn_id", ""))
+        # A story seen again (long-lived Deduper in daemon.py) is not its own duplicate
+        for url, reason in ((it.get("url"), "url"), (it.get("canonical_url"), "canonical")):
+            rep = self.by_url.get(canonical_url(url)) if url else None
+            if rep and rep != hn_id:
+                return rep, reason
+        if h is not None:
+            for band in self._bands(h):
+                for other, rep in self.by_band.get(band, []):
+                    if rep != hn_id and bin(h ^ other).count("1") <= self.distance:
+                        return rep, "text"
+        return None
+
+    def add(self, it: dict, h: int | None) -> None:
+        hn_id = str(it.get("hn_id", ""))
+        self._forget(hn_id)
+        urls = []
+        for url in (it.get("url"), it.get("canonical_url")):
+            if url and self.by_url.setdefault(canonical_url(url), hn_id) == hn_id:
+                urls.append(canonical_url(url))
+        if h is not None:
+            for band in self._bands(h):
+                self.by_band.setdefault(band, []).append((h, hn_id))
+        self.stories[hn_id] = (urls, h)
+        while len(self.stories) > self.max_stories:
+            self._forget(next(iter(self.stories)))
+
+    def _forget(self, hn_id: str) -> None:
+        urls, h = self.stories.pop(hn_id, ([], None))
+        for url in urls:
+            if self.by_url.get(url) == hn_id:
+                del self.by_url[url]
+        if h is not None:
+            for band in self._bands(h):
+                kept = [e for e in self.by_band.get(band, []) if e[1] != hn_id]
+                if kept:
+                    self.by_band[band] = kept
+                else:
+                    self.by_band.pop(band, None)
+
+    def process(self, it: dict) -> bool:
+        """Mark it as a duplicate (True) or register it as a representative."""
+        if it.get("duplicate_of"):
+            return True
+        h = simhash(it.get("source_text") or "") if it.get("body_source") == "readability" else None
+        dup = self.check(it, h)
+        if dup:
+            it["duplicate_of"], it["dup_reason"] = dup
+            return True
+        self.add(it, h)
+        return False
+
+
+def mark_duplicates(items: list[dict]) -> int:
+    """URL-level pass over a front page; returns how many items were marked."""
+    deduper = Deduper()
+    return sum(deduper.process(it) for it in items)
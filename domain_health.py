@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Persistent per-domain health of article fetches, with a circuit breaker.
+
+Every article fetch records its outcome (ok, no_text or error:<type>) and
+duration for the domain in DOMAIN_HEALTH_FILE (last DOMAIN_HEALTH_HISTORY
+per domain). Non-HTML responses say nothing about the domain and are not
+recorded.
+
+After DOMAIN_CIRCUIT_FAILURES failures in a row a domain's circuit opens:
+its articles are skipped (body_source=domain_circuit_open) for
+DOMAIN_CIRCUIT_OPEN_SEC, doubling each time it opens again up to
+DOMAIN_CIRCUIT_MAX_SEC. Once that has passed one article is fetched as a
+probe; success closes the circuit, failure re-opens it.
+
+success_rate() (the recent share of successful fetches) lets
+fetch_article_text.py keep more fetches in flight when the next domains
+are likely to fail, so they don't hold body fetch slots idle.
+Domains not fetched for DOMAIN_HEALTH_MAX_AGE_DAYS are dropped on save.
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DOMAIN_HEALTH = os.getenv("DOMAIN_HEALTH", "true").lower() in ("1", "true", "yes")
+DOMAIN_HEALTH_FILE = Path(os.getenv("DOMAIN_HEALTH_FILE", "data/domain_health.json"))
+DOMAIN_HEALTH_HISTORY = max(1, int(os.getenv("DOMAIN_HEALTH_HISTORY", "20")))
+DOMAIN_HEALTH_MAX_AGE_DAYS = float(os.getenv("DOMAIN_HEALTH_MAX_AGE_DAYS", "30"))
+DOMAIN_CIRCUIT_FAILURES = max(1, int(os.getenv("DOMAIN_CIRCUIT_FAILURES", "3")))
+DOMAIN_CIRCUIT_OPEN_SEC = float(os.getenv("DOMAIN_CIRCUIT_OPEN_SEC", "3600"))
+DOMAIN_CIRCUIT_MAX_SEC = float(os.getenv("DOMAIN_CIRCUIT_MAX_SEC", "604800"))
+
+# A PDF or image link fails for that URL only
+NEUTRAL_OUTCOMES = ("error:UnsupportedContentType",)
+
+
+class DomainHealth:
+    def __init__(self, path: Path = DOMAIN_HEALTH_FILE):
+        self.path = path
+        # domain -> {"recent": [[ts, outcome, seconds], ...], "failures", "opens", "open_until", "seen"}
+        self.domains: dict[str, dict] = {}
+        self.probing: set[str] = set()
+        self.skipped = 0
+        self.lock = threading.Lock()
+        if path.exists():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.domains = json.load(f).get("domains", {})
+            except Exception:
+                self.domains = {}
+
+    def allow(self, domain: str) -> bool:
+        """Whether to fetch an article from domain now (one probe at a time once an open circuit expires)."""
+        with self.lock:
+            e = self.domains.get(domain)
+            if not e or e["failures"] < DOMAIN_CIRCUIT_FAILURES:
+                return True
+            if e["open_until"] <= time.time() and domain not in self.probing:
+                self.probing.add(domain)
+                return True
+            self.skipped += 1
+            return False
+
+    def success_rate(self, domain: str) -> float:
+        """Recent share of successful fetches; 1.0 for a domain never fetched."""
+        e = self.domains.get(domain)
+        recent = e["recent"] if e else []
+        ok = sum(1 for r in recent if r[1] == "ok")
+        return (ok + 1) / (len(recent) + 1)
+
+    def release(self, domain: str) -> None:
+        """End a probe that said nothing about the domain (e.g. served from the HTTP cache)."""
+        with self.lock:
+            self.probing.discard(domain)
+
+    def record(self, domain: str, body_source: str, seconds: float) -> None:
+        # A neutral probe still ends, or the domain would never be probed again
+        self.release(domain)
+        if not domain or body_source in NEUTRAL_OUTCOMES:
+            return
+        ok = body_source in ("ogp_only", "readability")
+        now = time.time()
+        with self.lock:
+            e = self.domains.setdefault(
+                domain, {"recent": [], "failures": 0, "opens": 0, "open_until": 0, "seen": 0}
+            )
+            e["recent"].append([int(now), "ok" if ok else body_source, round(seconds, 3)])
+            del e["recent"][:-DOMAIN_HEALTH_HISTORY]
+            e["seen"] = now
+            if ok:
+                e.update(failures=0, opens=0, open_until=0)
+                return
+            e["failures"] += 1
+            # Fetches already in flight when the circuit opened don't extend it
+            if e["failures"] >= DOMAIN_CIRCUIT_FAILURES and e["open_until"] <= now:
+                wait = min(DOMAIN_CIRCUIT_MAX_SEC, DOMAIN_CIRCUIT_OPEN_SEC * 2 ** e["opens"])
+                e["open_until"] = now + wait
+                e["opens"] += 1
+                print(f"[domain_health] circuit open for {domain} ({e['failures']} failures, last {body_source}), retry in {wait:.0f}s")
+
+    @property
+    def stats(self) -> str:
+        now = time.time()
+        open_ = sum(1 for e in self.domains.values() if e["failures"] >= DOMAIN_CIRCUIT_FAILURES and e["open_until"] > now)
+        return f"domains={len(self.domains)} open_circuits={open_} skipped_articles={self.skipped}"
+
+    def save(self) -> None:
+        cutoff = time.time() - DOMAIN_HEALTH_MAX_AGE_DAYS * 86400
+        with self.lock:
+            self.domains = {k: v for k, v in self.domains.items() if v["seen"] >= cutoff}
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"domains": self.domains}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Fan-out runner: one fetch/summarize pass, one digest per Slack target.
+
+FANOUT_FILE (default fanout.json, see fanout.example.json) lists targets:
+
+  [{"name": "eng-en", "webhook_env": "SLACK_WEBHOOK_URL_ENG", "lang": "en",
+    "top_n": 30, "msg_limit": 3500, "prefix": ":newspaper:"}, ...]
+
+name and a webhook (webhook, or webhook_env naming an environment
+variable) are required; lang, top_n, msg_limit, prefix and split_mode
+default to PROMPT_LANG, HN_TOP_N, SLACK_MSG_LIMIT, SLACK_PREFIX and
+SLACK_SPLIT_MODE.
+
+The front page is fetched once (as many stories as the largest top_n),
+articles and comments once for all of them, and each distinct language is
+summarized once, over the largest top_n among its targets. Every target
+then renders the first top_n stories with its own settings, so another
+channel only costs its Slack messages.
+"""
+import json
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import build_slack_payload  # noqa: E402
+import fetch_article_text  # noqa: E402
+import fetch_hn  # noqa: E402
+import pack_input  # noqa: E402
+import summarize  # noqa: E402
+from post_to_slack import SlackDeliveryError, get_client  # noqa: E402
+from tracing import span  # noqa: E402
+
+FANOUT_FILE = Path(os.getenv("FANOUT_FILE", "fanout.json"))
+
+
+def load_targets(path: Path = FANOUT_FILE) -> list[dict]:
+    """Targets from path with defaults filled in; exits on an invalid file."""
+    if not path.exists():
+        raise SystemExit(f"Fan-out config not found: {path} (see fanout.example.json)")
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    targets = []
+    for i, t in enumerate(raw):
+        name = str(t.get("name") or "").strip()
+        if not name:
+            raise SystemExit(f"{path}: target {i + 1} has no name")
+        webhook = (t.get("webhook") or os.getenv(t.get("webhook_env") or "", "")).strip()
+        targets.append({
+            "name": name,
+            "webhook": webhook,
+            "lang": t.get("lang") or summarize.PROMPT_LANG,
+            "top_n": int(t.get("top_n") or build_slack_payload.HN_TOP_N),
+            "msg_limit": int(t.get("msg_limit") or build_slack_payload.SLACK_MSG_LIMIT),
+            "prefix": t.get("prefix", build_slack_payload.SLACK_PREFIX),
+            "split_mode": t.get("split_mode") or build_slack_payload.SLACK_SPLIT_MODE,
+        })
+    if len({t["name"] for t in targets}) < len(targets):
+        raise SystemExit(f"{path}: target names must be unique")
+    return targets
+
+
+def summarize_lang(items: list[dict], hn: dict, lang: str) -> dict:
+    """summaries.json-style result for items in one prompt language."""
+    parts = []
+    for num, item, result in summarize.summarize_items(items, hn, len(items), prompt_lang=lang):
+        if result:
+            parts.append(result)
+        elif not item.get("duplicate_of"):
+            print(f"  -> SKIPPED {num}/{len(items)} (all retries failed)", file=sys.stderr)
+    return summarize.merge_results(parts, hn.get("date", ""), "ja" if "ja" in lang else "en")
+
+
+def main() -> None:
+    targets = load_targets()
+    top_n = max(t["top_n"] for t in targets)
+    langs: dict[str, int] = {}
+    for t in targets:
+        langs[t["lang"]] = max(langs.get(t["lang"], 0), t["top_n"])
+    print(f"[fanout] {len(targets)} targets, languages {sorted(langs)}, top {top_n}")
+
+    with span("stage", stage="fetch_hn"):
+        hn = fetch_hn.fetch_front_page(top_n=top_n)
+    items = hn["items"]
+
+    with span("stage", stage="fetch_article_text"):
+        for it in fetch_article_text.iter_fetched_items(items):
+            pack_input.pack_item(it)
+
+    sm: dict[str, dict] = {}
+    for lang, n in langs.items():
+        print(f"[fanout] Summarize {min(n, len(items))} items ({lang})...")
+        with span("stage", stage="summarize", lang=lang):
+            sm[lang] = summarize_lang(items[:n], hn, lang)
+
+    failed = []
+    for t in targets:
+        with span("stage", stage="build_slack_payload", target=t["name"]):
+            payloads, today = build_slack_payload.build_payloads(
+                {**hn, "items": items[: t["top_n"]]},
+                sm[t["lang"]],
+                top_n=t["top_n"],
+                prefix=t["prefix"],
+                limit=t["msg_limit"],
+                mode=t["split_mode"],
+            )
+            path = build_slack_payload.write_payloads(payloads, today, t["name"])
+        print(f"[fanout] {t['name']}: {len(payloads)} message(s) -> {path}")
+        if not payloads:
+            continue
+        if not t["webhook"]:
+            print(f"[fanout] {t['name']}: no webhook set, skipping post", file=sys.stderr)
+            continue
+        try:
+            with span("stage", stage="post_to_slack", target=t["name"]):
+                sent = get_client(t["webhook"]).post_all(payloads, os.path.basename(path))
+            print(f"[fanout] {t['name']}: posted {sent} message(s) ({len(payloads) - sent} already delivered)")
+        except SlackDeliveryError as e:
+            # Other targets still get their digest; a re-run resumes this one
+            print(f"[fanout] {t['name']}: {e}", file=sys.stderr)
+            failed.append(t["name"])
+    if failed:
+        raise SystemExit(f"[fanout] delivery failed for: {', '.join(failed)}")
+    fetch_hn.mark_emitted(items)
+    print("[fanout] Done.")
+
+
+if __name__ == "__main__":
+    main()
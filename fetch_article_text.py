@@ -1,13 +1,32 @@
 #!/usr/bin/env python3
+import codecs
 import json
+import multiprocessing
 import os
 import re
+import signal
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from html.parser import HTMLParser
+from typing import Iterator
 from urllib.parse import urlparse
 from datetime import date
 
 import requests
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from artifacts import ArtifactWriter, stories_id
+from comment_store import COMMENT_STORE, CommentStore
+from dedup import DEDUP, Deduper, canonical_url
+from domain_health import DOMAIN_HEALTH, DomainHealth
+from http_cache import HTTP_CACHE, HttpCache
+from state_store import STATE_DB, StateStore, use_sqlite
+from tracing import span
 
 try:
     from readability import Document
@@ -19,16 +38,62 @@ load_dotenv()
 FETCH_ARTICLE_BODY = os.getenv("FETCH_ARTICLE_BODY", "false").lower() == "true"
 BODY_FETCH_MAX = int(os.getenv("BODY_FETCH_MAX", "5"))
 BODY_MODE = os.getenv("BODY_MODE", "ogp_only").strip()
+PAGE_CACHE_KEY = f"{BODY_MODE}:page"
 TIMEOUT = int(os.getenv("REQUEST_TIMEOUT_SEC", "15"))
 UA = os.getenv("USER_AGENT", "hn-digest-bot/1.0")
 ALLOW = [d.strip() for d in os.getenv("ALLOW_DOMAINS", "").split(",") if d.strip()]
 DENY = [d.strip() for d in os.getenv("DENY_DOMAINS", "").split(",") if d.strip()]
 MAX_CHARS = int(os.getenv("MAX_SOURCE_CHARS", "12000"))
+# Stop downloading a page after this many bytes (ogp_only also stops at </head>)
+BODY_MAX_BYTES = int(os.getenv("BODY_MAX_BYTES", "2000000"))
+CHARSET_SNIFF_BYTES = 65536
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
 
+HN_API_BASE = os.getenv("HN_API_BASE", "https://hn.algolia.com/api/v1").rstrip("/")
 HN_COMMENTS_MAX = int(os.getenv("HN_COMMENTS_MAX", "15"))  # 0で無効
+HN_FILE = "data/hn.json"
+OUTPUT_FILE = "data/hn_with_text.jsonl"
+# Pages of HN_COMMENTS_MAX comments requested per story and run (deeper threads)
+HN_COMMENTS_PAGES = max(1, int(os.getenv("HN_COMMENTS_PAGES", "1")))
+# Comments change faster than articles, so their cache entries go stale sooner
+HTTP_CACHE_COMMENTS_TTL_SEC = int(os.getenv("HTTP_CACHE_COMMENTS_TTL_SEC", "900"))
+
+# Concurrency: total worker threads, and simultaneous requests per host (politeness)
+FETCH_CONCURRENCY = max(1, int(os.getenv("FETCH_CONCURRENCY", "4")))
+FETCH_PER_HOST_MAX = max(1, int(os.getenv("FETCH_PER_HOST_MAX", "2")))
+
+# Processes decoding / parsing downloaded pages and comments (0: in the fetch
+# threads). auto: one per core, up to FETCH_CONCURRENCY, in readability mode.
+_extract_processes = os.getenv("EXTRACT_PROCESSES", "auto").strip().lower()
+if _extract_processes == "auto":
+    _cores = min(os.cpu_count() or 1, FETCH_CONCURRENCY)
+    EXTRACT_PROCESSES = _cores if BODY_MODE == "readability" and _cores > 1 else 0
+else:
+    EXTRACT_PROCESSES = max(0, int(_extract_processes))
+# CPU seconds one document may take in an extraction process
+EXTRACT_CPU_SEC = float(os.getenv("EXTRACT_CPU_SEC", "10"))
 
 headers = {"User-Agent": UA}
 
+# One keep-alive session shared by all workers (Algolia + article hosts)
+session = requests.Session()
+session.headers.update(headers)
+_adapter = HTTPAdapter(pool_connections=FETCH_CONCURRENCY, pool_maxsize=FETCH_CONCURRENCY)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+_host_slots: dict[str, threading.Semaphore] = {}
+_host_slots_lock = threading.Lock()
+
+
+def host_slot(url: str) -> threading.Semaphore:
+    """Semaphore limiting concurrent requests to url's host to FETCH_PER_HOST_MAX."""
+    host = (urlparse(url).netloc or "").lower()
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.Semaphore(FETCH_PER_HOST_MAX)
+        return _host_slots[host]
+
 
 def domain_of(url: str) -> str:
     try:
@@ -45,17 +110,76 @@ def allowed_domain(domain: str) -> bool:
     return True
 
 
+class _HeadDone(Exception):
+    pass
+
+
+class HeadMetaParser(HTMLParser):
+    """Event-based parser that collects <meta> content and <title> from the head.
+
+    Parsing stops at </head> (or the first <body>), so the rest of the
+    document is never tokenized.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: dict[str, str] = {}
+        self.title = ""
+        self.canonical = ""
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "meta":
+            a = dict(attrs)
+            content = a.get("content")
+            if not content:
+                return
+            for attr in ("property", "name"):
+                key = a.get(attr)
+                if key:
+                    # First occurrence wins, like soup.find
+                    self.meta.setdefault(f"{attr}:{key}", content)
+        elif tag == "link":
+            a = dict(attrs)
+            rel = (a.get("rel") or "").lower().split()
+            if "canonical" in rel and a.get("href") and not self.canonical:
+                self.canonical = a["href"].strip()
+        elif tag == "title":
+            self._in_title = True
+        elif tag == "body":
+            raise _HeadDone
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag == "head":
+            raise _HeadDone
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+
+
+def parse_head_meta(html: str) -> HeadMetaParser:
+    parser = HeadMetaParser()
+    try:
+        parser.feed(html)
+        parser.close()
+    except _HeadDone:
+        pass
+    return parser
+
+
 def extract_ogp_description(html: str) -> str:
-    soup = BeautifulSoup(html, "lxml")
+    return ogp_description(parse_head_meta(html))
+
+
+def ogp_description(head: HeadMetaParser) -> str:
     # Prefer og:description, then meta description
-    for sel in [
-        ("meta", {"property": "og:description"}),
-        ("meta", {"name": "description"}),
-        ("meta", {"property": "twitter:description"}),
-    ]:
-        tag = soup.find(*sel)
-        if tag and tag.get("content"):
-            return tag["content"].strip()
+    for key in ("property:og:description", "name:description", "property:twitter:description"):
+        content = head.meta.get(key, "").strip()
+        if content:
+            return content
     return ""
 
 
@@ -72,110 +196,530 @@ def extract_readable_text(html: str) -> str:
     return text.strip()
 
 
+class UnsupportedContentType(Exception):
+    pass
+
+
+_HEAD_END = re.compile(rb"</head\s*>|<body[\s>]", re.I)
+_CHARSET_PARAM = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.I)
+_META_CHARSET = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?\s*([\w.:-]+)", re.I)
+
+
+def http_get(url: str, extra_headers: dict | None = None, stream: bool = False) -> requests.Response:
+    """GET url within its host's FETCH_PER_HOST_MAX slots.
+
+    A streamed response keeps its slot until it is closed, so the body
+    download (read_html_body) counts against the host's limit too.
+    """
+    slot = host_slot(url)
+    slot.acquire()
+    try:
+        with span("http", domain=domain_of(url), conditional=bool(extra_headers)) as sp:
+            r = session.get(url, headers=extra_headers, timeout=TIMEOUT, stream=stream)
+            sp["status"] = r.status_code
+            sp["bytes"] = int(r.headers.get("Content-Length") or 0) or None
+    except BaseException:
+        slot.release()
+        raise
+    if not stream:
+        slot.release()
+        return r
+    close = r.close
+    released = threading.Event()
+
+    def close_and_release() -> None:
+        try:
+            close()
+        finally:
+            if not released.is_set():
+                released.set()
+                slot.release()
+
+    r.close = close_and_release
+    return r
+
+
+def read_html_body(r: requests.Response) -> bytes:
+    """Stream an HTML response, giving up early on non-HTML content types.
+
+    Reads at most BODY_MAX_BYTES; in ogp_only mode stops once the head ends.
+    """
+    try:
+        ctype = (r.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if ctype and ctype not in HTML_CONTENT_TYPES:
+            raise UnsupportedContentType(ctype)
+        head_only = BODY_MODE != "readability"
+        buf = bytearray()
+        for chunk in r.iter_content(chunk_size=16384):
+            # Overlap the previous chunk slightly so a split "</head>" still matches
+            start = max(0, len(buf) - 8)
+            buf += chunk
+            if len(buf) >= BODY_MAX_BYTES:
+                break
+            if head_only and _HEAD_END.search(buf, start):
+                break
+        return bytes(buf[:BODY_MAX_BYTES])
+    finally:
+        r.close()
+
+
+def _valid_codec(name: bytes | str | None) -> str | None:
+    if isinstance(name, bytes):
+        name = name.decode("ascii", "ignore")
+    if not name:
+        return None
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def decode_html(body: bytes, content_type: str | None = None) -> str:
+    """Decode HTML using the header charset, then BOM / <meta> charset, then a sniffed prefix."""
+    m = _CHARSET_PARAM.search(content_type or "")
+    enc = _valid_codec(m.group(1)) if m else None
+    if not enc and body.startswith(codecs.BOM_UTF8):
+        enc = "utf-8-sig"
+    if not enc:
+        m = _META_CHARSET.search(body, 0, CHARSET_SNIFF_BYTES)
+        enc = _valid_codec(m.group(1)) if m else None
+    if not enc:
+        enc = _valid_codec(requests.compat.chardet.detect(body[:CHARSET_SNIFF_BYTES])["encoding"])
+    return body.decode(enc or "utf-8", errors="replace")
+
+
 def fetch(url: str) -> str:
-    r = requests.get(url, headers=headers, timeout=TIMEOUT)
-    r.raise_for_status()
-    # Respect encoding if provided
-    r.encoding = r.apparent_encoding
-    return r.text
+    with http_get(url, stream=True) as r:
+        r.raise_for_status()
+        return decode_html(read_html_body(r), r.headers.get("Content-Type"))
+
+
+def extract_page(html: str) -> list[str]:
+    """[article text per BODY_MODE, <link rel=canonical> href] of a page."""
+    head = parse_head_meta(html)
+    if BODY_MODE == "readability":
+        text = extract_readable_text(html)
+    else:
+        text = ogp_description(head)
+    return [text, head.canonical]
+
+
+def page_from_bytes(body: bytes, content_type: str | None) -> list[str]:
+    return extract_page(decode_html(body, content_type))
+
+
+class ExtractTimeout(Exception):
+    pass
+
+
+_cpu_limit_hit = False
+
 
+def _on_cpu_limit(signum, frame):
+    global _cpu_limit_hit
+    _cpu_limit_hit = True
+    raise ExtractTimeout(f"over {EXTRACT_CPU_SEC:g}s CPU")
 
-def fetch_hn_comments_via_algolia(story_id: str, max_comments: int) -> list[str]:
+
+def _init_extract_worker() -> None:
+    signal.signal(signal.SIGPROF, _on_cpu_limit)
+
+
+def _cpu_limited(fn, *args):
+    """fn(*args) in an extraction process, interrupted after EXTRACT_CPU_SEC of CPU time."""
+    global _cpu_limit_hit
+    _cpu_limit_hit = False
+    # One-shot, and disarmed before any cleanup below, so SIGPROF can't interrupt it
+    signal.setitimer(signal.ITIMER_PROF, EXTRACT_CPU_SEC)
+    try:
+        try:
+            return fn(*args)
+        finally:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+    except Exception:
+        if _cpu_limit_hit:  # readability re-raises it as Unparseable
+            raise ExtractTimeout(f"over {EXTRACT_CPU_SEC:g}s CPU") from None
+        raise
+
+
+_extract_pool: ProcessPoolExecutor | None = None
+_extract_pool_lock = threading.Lock()
+
+
+def run_extraction(fn, *args):
+    """fn(*args) on the EXTRACT_PROCESSES pool, or in this thread if there is none.
+
+    Only the pool enforces EXTRACT_CPU_SEC: SIGPROF can't target one of
+    several fetch threads, so with EXTRACT_PROCESSES=0 parsing is unbounded.
+
+    Arguments go over as the raw response bytes; the fetch thread waits
+    without holding the GIL, so other downloads carry on meanwhile.
+    """
+    global _extract_pool
+    if EXTRACT_PROCESSES <= 0:
+        return fn(*args)
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            # spawn: forking a process with live fetch threads can deadlock
+            _extract_pool = ProcessPoolExecutor(
+                EXTRACT_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_extract_worker,
+            )
+        pool = _extract_pool
+    try:
+        return pool.submit(_cpu_limited, fn, *args).result()
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); later documents get a fresh pool
+        with _extract_pool_lock:
+            if _extract_pool is pool:
+                _extract_pool = None
+        raise
+
+
+def extract_html(body: bytes, content_type: str | None = None) -> list[str]:
+    """extract_page of a downloaded page, decoded and parsed via run_extraction."""
+    with span("extract", mode=BODY_MODE, html_bytes=len(body), procs=EXTRACT_PROCESSES) as sp:
+        text, canonical = run_extraction(page_from_bytes, body, content_type)
+        sp["chars"] = len(text)
+        return [text, canonical]
+
+
+class _TextCollector(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+
+    def handle_data(self, data):
+        self.parts.append(data)
+
+
+def html_to_text(html: str, sep: str = "\n") -> str:
+    """Text nodes joined by sep, like BeautifulSoup(html, "lxml").get_text(sep).
+
+    Matches it on HN comment markup (bench/fixtures/comments.json); lxml's
+    repairs of malformed HTML can still give different text.
+    """
+    collector = _TextCollector()
+    collector.feed(html)
+    collector.close()
+    return sep.join(collector.parts)
+
+
+def clean_comment_hits(hits: list[dict]) -> list[dict]:
+    """Algolia comment hits -> [{id, created_at, text}] with plain-text bodies."""
+    out: list[dict] = []
+    for h in hits:
+        t = h.get("comment_text") or ""
+        if not t:
+            continue
+        txt = html_to_text(t).strip()
+        if txt:
+            out.append({
+                "id": str(h.get("objectID", "")),
+                "created_at": int(h.get("created_at_i") or 0),
+                "text": txt[:3000],
+            })
+    return out
+
+
+def parse_algolia_comments(body: bytes) -> tuple[list[dict], int]:
+    """(cleaned comments, nbPages) of an Algolia comment search response."""
+    data = json.loads(body)
+    return clean_comment_hits(data.get("hits", [])), int(data.get("nbPages") or 0)
+
+
+def comment_texts_from_algolia(body: bytes, content_type: str | None = None) -> list[str]:
+    comments, _ = run_extraction(parse_algolia_comments, body)
+    return [c["text"] for c in comments]
+
+
+def update_comment_store(story_id: str, per_page: int, store: CommentStore) -> None:
+    """Pull comments newer than the newest one already stored for story_id.
+
+    The first fetch of a story uses relevance order (/search) like the
+    stateless path; later ones use /search_by_date with a created_at filter.
+    """
+    if not store.due(story_id):
+        return
+    since = store.last_created_at(story_id)
+    for page in range(HN_COMMENTS_PAGES):
+        if since is None:
+            api = (
+                f"{HN_API_BASE}/search?tags=comment,story_{story_id}"
+                f"&hitsPerPage={per_page}&page={page}"
+            )
+        else:
+            api = (
+                f"{HN_API_BASE}/search_by_date?tags=comment,story_{story_id}"
+                f"&numericFilters=created_at_i>{since}&hitsPerPage={per_page}&page={page}"
+            )
+        r = http_get(api)
+        r.raise_for_status()
+        comments, pages = run_extraction(parse_algolia_comments, r.content)
+        store.add(story_id, comments)
+        if page + 1 >= pages:
+            break
+
+
+def fetch_hn_comments_via_algolia(
+    story_id: str,
+    max_comments: int,
+    cache: HttpCache | None = None,
+    store: CommentStore | None = None,
+) -> list[str]:
     """
     Algolia HN Search API: comments of story X
     GET /api/v1/search?tags=comment,story_<id>&hitsPerPage=<n>
     comment_text is HTML.
+    With a CommentStore, only comments newer than the last seen are requested.
     """
     if not story_id or max_comments <= 0:
         return []
-    api = f"https://hn.algolia.com/api/v1/search?tags=comment,story_{story_id}&hitsPerPage={max_comments}"
-    r = requests.get(api, headers=headers, timeout=TIMEOUT)
+    if store is not None:
+        update_comment_store(story_id, max_comments, store)
+        return store.texts(story_id, max_comments)
+    api = f"{HN_API_BASE}/search?tags=comment,story_{story_id}&hitsPerPage={max_comments}"
+    if cache is not None:
+        return cache.fetch(
+            api, http_get, comment_texts_from_algolia, "comments", ttl=HTTP_CACHE_COMMENTS_TTL_SEC
+        )
+    r = http_get(api)
     r.raise_for_status()
-    data = r.json()
-    hits = data.get("hits", [])
-    texts: list[str] = []
-    for h in hits:
-        t = h.get("comment_text") or ""
-        if not t:
-            continue
-        soup = BeautifulSoup(t, "lxml")
-        txt = soup.get_text("\n").strip()
-        if txt:
-            texts.append(txt[:3000])
-    return texts
+    return comment_texts_from_algolia(r.content)
 
 
-def main() -> None:
-    # Load HN list
-    with open("data/hn.json", encoding="utf-8") as f:
-        hn = json.load(f)
-    items = hn["items"]
+def attach_comments(
+    it: dict, cache: HttpCache | None = None, store: CommentStore | None = None
+) -> None:
+    """Fetch HN comments for one item (independent of article body fetching)."""
+    it["comment_texts"] = []
+    it["comment_count_fetched"] = 0
+    if HN_COMMENTS_MAX <= 0 or it.get("duplicate_of"):
+        return
+    story_id = str(it.get("hn_id") or "")
+    with span("comments", hn_id=story_id, domain=domain_of(HN_API_BASE)) as sp:
+        try:
+            c = fetch_hn_comments_via_algolia(story_id, HN_COMMENTS_MAX, cache, store)
+            it["comment_texts"] = c
+            it["comment_count_fetched"] = len(c)
+        except Exception as e:
+            it["comment_texts"] = []
+            it["comment_count_fetched"] = 0
+            it["comment_fetch_error"] = sp["error"] = type(e).__name__
+        sp["count"] = it["comment_count_fetched"]
 
-    fetched_body = 0
+
+def fetch_body(
+    url: str, cache: HttpCache | None = None, hn_id: str = "", health: DomainHealth | None = None
+) -> tuple[str, str, str]:
+    """Download and extract one article. Returns (source_text, body_source, canonical href)."""
+    with span("article", hn_id=hn_id, domain=domain_of(url)) as sp:
+        t0 = time.monotonic()
+        # A fresh cached extraction made no request, so it says nothing about the domain
+        cached = cache is not None and cache.is_fresh(url, PAGE_CACHE_KEY)
+        text, src, canonical = _fetch_body(url, cache)
+        if health is not None:
+            if cached:
+                health.release(domain_of(url))
+            else:
+                health.record(domain_of(url), src, time.monotonic() - t0)
+        sp["body_source"] = src
+        sp["chars"] = len(text)
+        if src.startswith("error:"):
+            sp["error"] = src[len("error:"):]
+        return text, src, canonical
+
+
+def _fetch_body(url: str, cache: HttpCache | None) -> tuple[str, str, str]:
+    src = "readability" if BODY_MODE == "readability" else "ogp_only"
+    try:
+        if cache is not None:
+            text, canonical = cache.fetch(
+                url,
+                partial(http_get, stream=True),
+                extract_html,
+                PAGE_CACHE_KEY,
+                read=read_html_body,
+                body="full" if BODY_MODE == "readability" else "head",
+            )
+        else:
+            with http_get(url, stream=True) as r:
+                r.raise_for_status()
+                body = read_html_body(r)
+            text, canonical = extract_html(body, r.headers.get("Content-Type"))
+
+        text = (text or "").strip()
+        if text:
+            return text[:MAX_CHARS], src, canonical
+        return "", "no_text", canonical
+    except Exception as e:
+        return "", f"error:{type(e).__name__}", ""
+
+
+def iter_fetched_items(
+    items: list[dict],
+    cache: HttpCache | None = None,
+    store: CommentStore | None = None,
+    deduper: Deduper | None = None,
+    body_budget: int = BODY_FETCH_MAX,
+    health: DomainHealth | None = None,
+) -> Iterator[dict]:
+    """Fetch comments and article text for items, yielding each one in order once done.
+
+    Work runs on FETCH_CONCURRENCY threads a little ahead of the consumer.
+    Article fetches in flight never exceed the remaining BODY_FETCH_MAX
+    budget and are settled in item order, so body_source (limit_reached in
+    particular) is exactly what a sequential pass would produce.
+    Stories whose canonical URL or article text repeats an earlier one are
+    marked duplicate_of (see dedup.py).
+
+    Articles on domains whose circuit is open are skipped
+    (domain_circuit_open, see domain_health.py). Further articles are
+    fetched ahead while the expected successes in flight (each domain's
+    recent success rate) fall short of the remaining budget, so domains
+    that tend to fail don't leave it unused.
+
+    cache / store / deduper / health default to fresh instances (per
+    HTTP_CACHE, COMMENT_STORE, DEDUP and DOMAIN_HEALTH); daemon.py passes
+    long-lived ones instead.
+    body_budget replaces BODY_FETCH_MAX (a resumed run passes what is left).
+    """
+    candidate: list[bool] = []
     for it in items:
         it["body_source"] = "none"
         it["source_text"] = ""
         it["domain"] = domain_of(it.get("url") or "")
 
-        # ---- HN comments (always independent of article body fetching) ----
-        it["comment_texts"] = []
-        it["comment_count_fetched"] = 0
-        if HN_COMMENTS_MAX > 0:
-            try:
-                story_id = str(it.get("hn_id") or "")
-                c = fetch_hn_comments_via_algolia(story_id, HN_COMMENTS_MAX)
-                it["comment_texts"] = c
-                it["comment_count_fetched"] = len(c)
-            except Exception as e:
-                it["comment_texts"] = []
-                it["comment_count_fetched"] = 0
-                it["comment_fetch_error"] = type(e).__name__
-
-        # ---- Article body / meta ----
-        url = it.get("url") or ""
-        if not url:
+        if not it.get("url"):
             it["body_source"] = "no_url"
-            continue
+        elif it.get("duplicate_of"):
+            it["body_source"] = "duplicate"
+        elif not FETCH_ARTICLE_BODY:
+            it["body_source"] = "disabled"
+        candidate.append(it["body_source"] == "none")
 
-        d = it.get("domain", "")
+    if cache is None and HTTP_CACHE:
+        cache = HttpCache()
+    if store is None and COMMENT_STORE:
+        store = CommentStore()
+    if deduper is None and DEDUP:
+        deduper = Deduper()
+    if health is None and DOMAIN_HEALTH:
+        health = DomainHealth()
+    duplicates = 0
+    fetched_body = 0
+    comment_jobs: dict[int, Future] = {}
+    body_jobs: dict[int, Future] = {}
+    expected: dict[int, float] = {}  # success rate of each article in flight
+    circuit_open: set[int] = set()
+    next_comment = next_body = 0
 
-        if not FETCH_ARTICLE_BODY:
-            it["body_source"] = "disabled"
-            continue
-        if fetched_body >= BODY_FETCH_MAX:
-            it["body_source"] = "limit_reached"
-            continue
-        if not allowed_domain(d):
-            it["body_source"] = "domain_blocked"
-            continue
+    with ThreadPoolExecutor(max_workers=FETCH_CONCURRENCY) as pool:
+        for i, it in enumerate(items):
+            # ---- HN comments (always independent of article body fetching) ----
+            while next_comment < min(len(items), i + FETCH_CONCURRENCY):
+                comment_jobs[next_comment] = pool.submit(attach_comments, items[next_comment], cache, store)
+                next_comment += 1
 
-        try:
-            html = fetch(url)
-            if BODY_MODE == "readability":
-                text = extract_readable_text(html)
-                src = "readability"
-            else:
-                text = extract_ogp_description(html)
-                src = "ogp_only"
-
-            text = (text or "").strip()
-            if text:
-                it["source_text"] = text[:MAX_CHARS]
-                it["body_source"] = src
-                fetched_body += 1
-            else:
-                it["body_source"] = "no_text"
-        except Exception as e:
-            it["body_source"] = f"error:{type(e).__name__}"
+            # ---- Article body / meta ----
+            while (
+                next_body < len(items)
+                and sum(expected.values()) < body_budget - fetched_body
+                and len(body_jobs) < body_budget - fetched_body + FETCH_CONCURRENCY
+            ):
+                nxt = items[next_body]
+                if candidate[next_body] and allowed_domain(nxt["domain"]):
+                    if health and not health.allow(nxt["domain"]):
+                        circuit_open.add(next_body)
+                    else:
+                        body_jobs[next_body] = pool.submit(
+                            fetch_body, nxt["url"], cache, str(nxt.get("hn_id") or ""), health
+                        )
+                        expected[next_body] = health.success_rate(nxt["domain"]) if health else 1.0
+                next_body += 1
+
+            if candidate[i]:
+                if fetched_body >= body_budget:
+                    it["body_source"] = "limit_reached"
+                elif not allowed_domain(it["domain"]):
+                    it["body_source"] = "domain_blocked"
+                elif i in circuit_open:
+                    it["body_source"] = "domain_circuit_open"
+                else:
+                    expected.pop(i)
+                    text, src, canonical = body_jobs.pop(i).result()
+                    it["body_source"] = src
+                    if canonical:
+                        it["canonical_url"] = canonical_url(canonical, it["url"])
+                    if text:
+                        it["source_text"] = text
+                        fetched_body += 1
+
+            comment_jobs.pop(i).result()
+            if deduper and deduper.process(it):
+                duplicates += 1
+            yield it
+
+    if duplicates:
+        print(f"[dedup] {duplicates} duplicate stories (not summarized, shown as related links)")
+    if cache:
+        cache.save()
+        print(f"[http_cache] {cache.stats}")
+    if store:
+        store.save()
+    if health:
+        health.save()
+        print(f"[domain_health] {health.stats}")
+
+
+def main() -> None:
+    if use_sqlite():
+        store = StateStore()
+        hn = store.load_run()
+        for it in iter_fetched_items(hn["items"]):
+            store.put_fetched(hn["date"], it)
+        fetched_body = sum(1 for it in hn["items"] if it["body_source"] in ("ogp_only", "readability"))
+        print(f"Wrote -> {STATE_DB} (fetched_body={fetched_body}, mode={BODY_MODE}, comments_max={HN_COMMENTS_MAX})")
+        return
+
+    # Load HN list
+    with open(HN_FILE, encoding="utf-8") as f:
+        hn = json.load(f)
+    items = hn["items"]
+    header = {
+        "stage": "fetch_article_text",
+        "date": hn.get("date") or date.today().isoformat(),
+        "total": len(items),
+        "stories": stories_id(items),
+        "body": [FETCH_ARTICLE_BODY, BODY_MODE, BODY_FETCH_MAX, HN_COMMENTS_MAX],
+    }
+    out = ArtifactWriter(OUTPUT_FILE, header)
+
+    # Items an interrupted run already wrote are kept; dedup still needs to see them
+    deduper = Deduper() if DEDUP else None
+    done: set[str] = set()
+    fetched_body = 0
+    for it in out.completed():
+        done.add(str(it.get("hn_id", "")))
+        fetched_body += it.get("body_source") in ("ogp_only", "readability")
+        if deduper:
+            deduper.process(it)
+    if done:
+        print(f"Resuming {OUTPUT_FILE}: {len(done)}/{len(items)} items already fetched")
 
-    os.makedirs("data", exist_ok=True)
-    out_path = "data/hn_with_text.json"
-    hn["date"] = hn.get("date") or date.today().isoformat()
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(hn, f, ensure_ascii=False, indent=2)
+    todo = [it for it in items if str(it.get("hn_id", "")) not in done]
+    for it in iter_fetched_items(todo, deduper=deduper, body_budget=BODY_FETCH_MAX - fetched_body):
+        out.write(it)
+        fetched_body += it["body_source"] in ("ogp_only", "readability")
+        # On disk now; don't keep every article in memory
+        it.pop("source_text", None)
+        it.pop("comment_texts", None)
+    out.commit()
 
-    print(f"Wrote -> {out_path} (fetched_body={fetched_body}, mode={BODY_MODE}, comments_max={HN_COMMENTS_MAX})")
+    print(f"Wrote -> {OUTPUT_FILE} (fetched_body={fetched_body}, mode={BODY_MODE}, comments_max={HN_COMMENTS_MAX})")
 
 
 if __name__ == "__main__":
-    main()
+    with span("stage", stage="fetch_article_text"):
+        main()
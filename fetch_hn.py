@@ -1,32 +1,145 @@
 #!/usr/bin/env python3
 import json
 import os
+import time
 from datetime import date
+from urllib.parse import urlparse
 
 import requests
 from dotenv import load_dotenv
 
+from dedup import DEDUP, mark_duplicates
+from state_store import STATE_DB, StateStore, use_sqlite
+from tracing import span
+
 load_dotenv()
 
 HN_TOP_N = int(os.getenv("HN_TOP_N", "20"))
 TIMEOUT = int(os.getenv("REQUEST_TIMEOUT_SEC", "15"))
-URL = f"https://hn.algolia.com/api/v1/search?tags=front_page&hitsPerPage={HN_TOP_N}"
+# Algolia HN Search API root (override to point at a local stand-in, e.g. bench/)
+HN_API_BASE = os.getenv("HN_API_BASE", "https://hn.algolia.com/api/v1").rstrip("/")
+
+
+def front_page_url(top_n: int) -> str:
+    return f"{HN_API_BASE}/search?tags=front_page&hitsPerPage={top_n}"
+
+
+URL = front_page_url(HN_TOP_N)
 CACHE_PATH = "data/hn.json"
 
+# Story history / delta mode
+HISTORY_PATH = "data/story_history.json"
+DELTA_PATH = "data/hn_delta.json"
+HN_DELTA = os.getenv("HN_DELTA", "").lower() in ("1", "true", "yes")
+HN_DELTA_MIN_POINTS = int(os.getenv("HN_DELTA_MIN_POINTS", "50"))
+HN_DELTA_MIN_COMMENTS = int(os.getenv("HN_DELTA_MIN_COMMENTS", "20"))
+HN_HISTORY_MAX_SAMPLES = int(os.getenv("HN_HISTORY_MAX_SAMPLES", "48"))
+HN_HISTORY_MAX_AGE_DAYS = float(os.getenv("HN_HISTORY_MAX_AGE_DAYS", "14"))
+
+# Keep-alive session (reused across polls by daemon.py)
+session = requests.Session()
+
 def load_cache():
+    if use_sqlite():
+        store = StateStore()
+        run_date = store.latest_run_date()
+        return {"date": run_date, "items": store.load_items(run_date)} if run_date else None
     if os.path.exists(CACHE_PATH):
         with open(CACHE_PATH, "r", encoding="utf-8") as f:
             return json.load(f)
     return None
 
 def save_cache(payload):
+    if use_sqlite():
+        StateStore().put_stories(payload["date"], payload["items"])
+        return
     os.makedirs("data", exist_ok=True)
     with open(CACHE_PATH, "w", encoding="utf-8") as f:
         json.dump(payload, f, ensure_ascii=False, indent=2)
 
-def main() -> None:
+def load_history() -> dict:
+    if os.path.exists(HISTORY_PATH):
+        with open(HISTORY_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+def save_history(history: dict) -> None:
+    cutoff = time.time() - HN_HISTORY_MAX_AGE_DAYS * 86400
+    history = {k: v for k, v in history.items() if v["last_seen"] >= cutoff}
+    os.makedirs("data", exist_ok=True)
+    tmp = HISTORY_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(history, f, ensure_ascii=False)
+    os.replace(tmp, HISTORY_PATH)
+
+def update_history(history: dict, items: list[dict], now: float) -> list[dict]:
+    """Record a points/comments sample per story; return the items that changed.
+
+    An item is in the delta when it was never emitted before, or when its
+    points or comment count moved by at least HN_DELTA_MIN_POINTS /
+    HN_DELTA_MIN_COMMENTS since it was last emitted. Stories stay in the
+    delta until mark_emitted() records them as delivered.
+    """
+    delta = []
+    for it in items:
+        points = it.get("points") or 0
+        comments = it.get("comments") or 0
+        h = history.setdefault(it["hn_id"], {"first_seen": now, "samples": [], "emitted": None})
+        h["last_seen"] = now
+        h["title"] = it.get("title", "")
+        h["samples"] = (h["samples"] + [[now, points, comments]])[-HN_HISTORY_MAX_SAMPLES:]
+
+        last = h["emitted"]
+        if last is None:
+            reason = "new"
+        elif points - last["points"] >= HN_DELTA_MIN_POINTS:
+            reason = "points"
+        elif comments - last["comments"] >= HN_DELTA_MIN_COMMENTS:
+            reason = "comments"
+        else:
+            continue
+        delta.append({**it, "delta_reason": reason, "first_seen": h["first_seen"]})
+    return delta
+
+def record_history(items: list[dict]) -> list[dict]:
+    """Add this fetch's samples to HISTORY_PATH and write the delta to DELTA_PATH."""
+    history = load_history()
+    delta = update_history(history, items, time.time())
+    save_history(history)
+    with open(DELTA_PATH, "w", encoding="utf-8") as f:
+        json.dump({"date": date.today().isoformat(), "items": delta}, f, ensure_ascii=False, indent=2)
+    print(f"Delta: {len(delta)}/{len(items)} new or changed -> {DELTA_PATH}")
+    return delta
+
+def mark_emitted(items: list[dict]) -> None:
+    """Record items as delivered, so delta mode skips them until they grow again.
+
+    Called once a story has been posted (or, in daemon.py, summarized into
+    the persisted digest queue); a run that fails before that leaves the
+    story in the next delta.
+    """
+    if not items:
+        return
+    now = time.time()
+    history = load_history()
+    for it in items:
+        h = history.setdefault(it["hn_id"], {"first_seen": now, "samples": [], "emitted": None, "last_seen": now})
+        h["emitted"] = {"at": now, "points": it.get("points") or 0, "comments": it.get("comments") or 0}
+    save_history(history)
+
+def fetch_front_page(
+    delta_only: bool = HN_DELTA, use_cache_on_error: bool = True, top_n: int = HN_TOP_N
+) -> dict:
+    """Fetch the top_n front-page stories as {"date", "items"}; falls back to the cache on error.
+
+    delta_only=True returns only new / changed stories (see update_history).
+    """
+    url = front_page_url(top_n)
     try:
-        r = requests.get(URL, timeout=TIMEOUT)
+        with span("http", domain=urlparse(url).netloc, what="front_page") as sp:
+            r = session.get(url, timeout=TIMEOUT)
+            sp["status"] = r.status_code
+            sp["bytes"] = len(r.content)
         r.raise_for_status()
         payload = r.json()
 
@@ -41,17 +154,28 @@ def main() -> None:
                 "comments": h.get("num_comments"),
             })
 
-        out = {"date": date.today().isoformat(), "items": items}
+        delta = record_history(items)
+
+        # HN_DELTA=true: downstream stages only see new / changed stories
+        out = {"date": date.today().isoformat(), "items": delta if delta_only else items}
+        if DEDUP:
+            dups = mark_duplicates(out["items"])
+            if dups:
+                print(f"Dedup: {dups} stories share a URL with a higher-ranked one")
         save_cache(out)
-        print(f"Wrote {len(items)} items -> {CACHE_PATH}")
-        return
+        print(f"Wrote {len(out['items'])} items -> {STATE_DB if use_sqlite() else CACHE_PATH}")
+        return out
 
     except Exception as e:
-        cached = load_cache()
+        cached = load_cache() if use_cache_on_error else None
         if cached:
             print(f"[WARN] Fetch failed ({type(e).__name__}). Using cached {CACHE_PATH}")
-            return
+            return cached
         raise
 
+def main() -> None:
+    fetch_front_page()
+
 if __name__ == "__main__":
-    main()
+    with span("stage", stage="fetch_hn"):
+        main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""On-disk HTTP cache for article and Algolia fetches.
+
+Bodies are stored gzip-compressed under HTTP_CACHE_DIR together with an
+index.json holding validators (ETag / Last-Modified) and the extracted
+value for each extraction mode. A fresh entry (younger than its TTL) or a
+304 answer to a conditional request reuses the stored extraction directly,
+skipping both the download and the parse. A body stored truncated (e.g.
+only the <head> in ogp_only mode) is not re-extracted for a mode that
+needs the whole page; that mode downloads it again.
+
+The index is trimmed to HTTP_CACHE_MAX_MB on save, least recently used first.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HTTP_CACHE = os.getenv("HTTP_CACHE", "true").lower() in ("1", "true", "yes")
+HTTP_CACHE_DIR = Path(os.getenv("HTTP_CACHE_DIR", "data/http_cache"))
+HTTP_CACHE_TTL_SEC = int(os.getenv("HTTP_CACHE_TTL_SEC", "21600"))  # 6 hours
+HTTP_CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "200"))
+
+# get(url, extra_headers) -> Response; read(response) -> body;
+# extract(body, content_type) -> value
+Getter = Callable[[str, dict], requests.Response]
+Reader = Callable[[requests.Response], bytes]
+Extractor = Callable[[bytes, str | None], Any]
+
+
+def read_all(r: requests.Response) -> bytes:
+    return r.content
+
+
+class HttpCache:
+    def __init__(self, root: Path = HTTP_CACHE_DIR):
+        self.root = root
+        self.index_path = root / "index.json"
+        self.index: dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.stats = {"fresh": 0, "revalidated": 0, "downloaded": 0}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, encoding="utf-8") as f:
+                    self.index = json.load(f)
+            except Exception:
+                self.index = {}
+
+    def _body_path(self, url: str) -> Path:
+        return self.root / (hashlib.sha256(url.encode("utf-8")).hexdigest() + ".gz")
+
+    def _read_body(self, url: str) -> bytes | None:
+        try:
+            with gzip.open(self._body_path(url), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_body(self, url: str, body: bytes) -> int:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self._body_path(url)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+        return path.stat().st_size
+
+    def is_fresh(self, url: str, key: str, ttl: int = HTTP_CACHE_TTL_SEC) -> bool:
+        """Whether fetch(url, ..., key) would answer from the cache without a request."""
+        with self.lock:
+            entry = self.index.get(url)
+            return bool(entry) and key in entry["extracted"] and time.time() - entry["fetched_at"] < ttl
+
+    def fetch(
+        self,
+        url: str,
+        get: Getter,
+        extract: Extractor,
+        key: str,
+        ttl: int = HTTP_CACHE_TTL_SEC,
+        read: Reader = read_all,
+        body: str = "full",
+    ) -> Any:
+        """Return extract(body, content_type) for url, reusing the cache where possible.
+
+        key names the extraction (e.g. BODY_MODE) so different extractors of
+        the same page are cached side by side. read turns a 200 response into
+        the body to store (e.g. a byte-capped streaming read); body names what
+        it keeps ("full", or e.g. "head" for a truncated read). A stored body
+        only serves extractions that need the same part or less.
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.index.get(url)
+            if entry and key in entry["extracted"] and now - entry["fetched_at"] < ttl:
+                entry["used_at"] = now
+                self.stats["fresh"] += 1
+                return entry["extracted"][key]
+
+        # A 304 would re-extract from the stored body, which must hold what extract needs
+        if entry and key not in entry["extracted"] and entry.get("body", "full") not in ("full", body):
+            entry = None
+        cond = {}
+        if entry:
+            if entry.get("etag"):
+                cond["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                cond["If-Modified-Since"] = entry["last_modified"]
+
+        r = get(url, cond)
+        if r.status_code == 304 and entry:
+            r.close()
+            with self.lock:
+                entry["fetched_at"] = entry["used_at"] = now
+                self.stats["revalidated"] += 1
+                if key in entry["extracted"]:
+                    return entry["extracted"][key]
+            body = self._read_body(url)
+            if body is not None:
+                value = extract(body, entry.get("content_type"))
+                with self.lock:
+                    entry["extracted"][key] = value
+                return value
+            # Body file went missing: fall back to an unconditional download.
+            r = get(url, {})
+
+        try:
+            r.raise_for_status()
+            data = read(r)
+        finally:
+            r.close()  # a streamed error response would otherwise hold its pooled connection
+        value = extract(data, r.headers.get("Content-Type"))
+        size = self._write_body(url, data)
+        with self.lock:
+            self.index[url] = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "content_type": r.headers.get("Content-Type"),
+                "fetched_at": now,
+                "used_at": now,
+                "size": size,
+                "body": body,
+                "extracted": {key: value},
+            }
+            self.stats["downloaded"] += 1
+        return value
+
+    def _entry_size(self, entry: dict) -> int:
+        return entry.get("size", 0) + len(json.dumps(entry["extracted"], ensure_ascii=False))
+
+    def evict(self) -> None:
+        """Drop least-recently-used entries until the cache fits HTTP_CACHE_MAX_MB."""
+        limit = HTTP_CACHE_MAX_MB * 1024 * 1024
+        total = sum(self._entry_size(e) for e in self.index.values())
+        for url, entry in sorted(self.index.items(), key=lambda kv: kv[1].get("used_at", 0)):
+            if total <= limit:
+                break
+            total -= self._entry_size(entry)
+            del self.index[url]
+            self._body_path(url).unlink(missing_ok=True)
+
+    def save(self) -> None:
+        with self.lock:
+            self.evict()
+            self.root.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp, self.index_path)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Summarizer backend for OpenAI-compatible chat/completions APIs.
+
+Selected with SUMMARIZER_BACKEND=openai (summarize.py). Instead of one
+`codex exec` process per item, every batch is a single POST over a pooled
+keep-alive session: the prompt (plus schema.json) is the system message
+and the batch's items are the user message. The reply is parsed and
+validated against schema.json in process; invalid replies count as a
+failed attempt and are retried like codex failures.
+
+Works with any server that speaks the chat/completions protocol
+(OpenAI, vLLM, llama.cpp server, Ollama, ...) via LLM_API_BASE.
+"""
+import json
+import os
+import re
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from tracing import span
+
+load_dotenv()
+
+LLM_API_BASE = os.getenv("LLM_API_BASE", "https://api.openai.com/v1").rstrip("/")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "").strip() or os.getenv("OPENAI_API_KEY", "").strip()
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+# json_schema (structured outputs), json_object (JSON mode) or none
+LLM_RESPONSE_FORMAT = os.getenv("LLM_RESPONSE_FORMAT", "json_schema").strip()
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "2"))
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+
+def validate(instance, schema: dict, path: str = "$") -> list[str]:
+    """Errors of instance against the JSON Schema subset schema.json uses.
+
+    Supports type (object/array/string/boolean/number/integer), enum,
+    properties, required, additionalProperties=false and items.
+    """
+    t = schema.get("type")
+    checks = {
+        "object": lambda v: isinstance(v, dict),
+        "array": lambda v: isinstance(v, list),
+        "string": lambda v: isinstance(v, str),
+        "boolean": lambda v: isinstance(v, bool),
+        "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+        "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    }
+    if t in checks and not checks[t](instance):
+        return [f"{path}: expected {t}"]
+    errors: list[str] = []
+    if "enum" in schema and instance not in schema["enum"]:
+        errors.append(f"{path}: {instance!r} not in {schema['enum']}")
+    if t == "object":
+        props = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in instance:
+                errors.append(f"{path}: missing {key}")
+        for key, value in instance.items():
+            if key in props:
+                errors += validate(value, props[key], f"{path}.{key}")
+            elif schema.get("additionalProperties") is False:
+                errors.append(f"{path}: unexpected {key}")
+    if t == "array" and "items" in schema:
+        for i, value in enumerate(instance):
+            errors += validate(value, schema["items"], f"{path}[{i}]")
+    return errors
+
+
+class ChatCompletionsBackend:
+    def __init__(self, schema: dict, pool_size: int = 4):
+        self.schema = schema
+        self.url = f"{LLM_API_BASE}/chat/completions"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if LLM_API_KEY:
+            self.session.headers["Authorization"] = f"Bearer {LLM_API_KEY}"
+
+    def request_body(self, prompt: str, payload: dict) -> dict:
+        system = prompt + "\n\nschema.json:\n" + json.dumps(self.schema, ensure_ascii=False)
+        body = {
+            "model": LLM_MODEL,
+            "temperature": LLM_TEMPERATURE,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": json.dumps(payload, ensure_ascii=False)},
+            ],
+        }
+        if LLM_RESPONSE_FORMAT == "json_schema":
+            body["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "hn_digest", "schema": self.schema, "strict": True},
+            }
+        elif LLM_RESPONSE_FORMAT == "json_object":
+            body["response_format"] = {"type": "json_object"}
+        return body
+
+    def parse_reply(self, data: dict) -> dict:
+        content = data["choices"][0]["message"]["content"] or ""
+        result = json.loads(_FENCE.sub("", content.strip()))
+        errors = validate(result, self.schema)
+        if errors:
+            raise ValueError("schema: " + "; ".join(errors[:5]))
+        return result
+
+    def summarize(self, prompt: str, payload: dict, tag: str, retries: int, timeout: float) -> dict | None:
+        """Summarize payload ({"date", "items"}). Returns schema-valid JSON or None."""
+        body = self.request_body(prompt, payload)
+        for attempt in range(1, retries + 1):
+            delay = 0.0
+            with span("llm", part=tag, attempt=attempt, model=LLM_MODEL) as sp:
+                try:
+                    r = self.session.post(self.url, json=body, timeout=timeout)
+                except requests.RequestException as e:
+                    sp["error"] = "timeout" if isinstance(e, requests.Timeout) else type(e).__name__
+                    print(f"  [attempt {attempt}/{retries}] {LLM_MODEL} request failed: {e}", file=sys.stderr)
+                    continue
+                sp["status"] = r.status_code
+                if r.status_code == 429 or r.status_code >= 500:
+                    sp["error"] = "http"
+                    delay = _retry_after(r, LLM_BACKOFF_BASE * 2 ** (attempt - 1))
+                    print(f"  [attempt {attempt}/{retries}] {LLM_MODEL} HTTP {r.status_code}", file=sys.stderr)
+                elif r.status_code >= 400:
+                    sp["error"] = "http"
+                    print(f"  {LLM_MODEL} HTTP {r.status_code}: {r.text[:300]}", file=sys.stderr)
+                    return None
+                else:
+                    try:
+                        data = r.json()
+                        usage = data.get("usage") or {}
+                        sp["prompt_tokens"] = usage.get("prompt_tokens")
+                        sp["completion_tokens"] = usage.get("completion_tokens")
+                        return self.parse_reply(data)
+                    except (ValueError, KeyError, IndexError, TypeError) as e:
+                        sp["error"] = "invalid"
+                        print(f"  [attempt {attempt}/{retries}] {LLM_MODEL} invalid reply: {e}", file=sys.stderr)
+            if delay and attempt < retries:
+                time.sleep(delay)
+        return None
+
+
+def _retry_after(r: requests.Response, default: float) -> float:
+    try:
+        return float(r.headers.get("Retry-After") or default)
+    except ValueError:
+        return default
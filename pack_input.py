@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Fit each item's LLM input into a token budget.
+
+Runs between fetch_article_text.py and summarize.py and rewrites
+data/hn_with_text.jsonl in place, record by record:
+- drops duplicate / near-duplicate comments (word-shingle Jaccard),
+- picks substantive, mutually diverse comments first (kept in original order),
+- trims source_text at paragraph (then sentence) boundaries,
+so that source_text + comment_texts stay within PACK_TOKEN_BUDGET tokens.
+
+PACK_TOKEN_BUDGET=0 disables packing.
+"""
+import math
+import os
+import re
+
+from dotenv import load_dotenv
+
+from artifacts import ArtifactWriter, read_artifact
+from state_store import STATE_DB, StateStore, use_sqlite
+from tracing import span
+
+load_dotenv()
+
+PACK_TOKEN_BUDGET = int(os.getenv("PACK_TOKEN_BUDGET", "6000"))
+# Share of the budget reserved for source_text; unused room goes to comments and vice versa
+PACK_ARTICLE_SHARE = float(os.getenv("PACK_ARTICLE_SHARE", "0.5"))
+PACK_NEAR_DUP = float(os.getenv("PACK_NEAR_DUP", "0.8"))
+PACK_MIN_COMMENT_CHARS = int(os.getenv("PACK_MIN_COMMENT_CHARS", "40"))
+
+INPUT_FILE = "data/hn_with_text.jsonl"
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 ASCII chars per token, ~1 token per non-ASCII char (CJK)."""
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def shingles(text: str, n: int = 3) -> set:
+    words = [w.lower() for w in _WORD.findall(text)]
+    if len(words) < n:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_comments(comments: list[str], budget: int) -> list[str]:
+    """Greedy diverse selection of comments within budget tokens, in original order."""
+    cands = []
+    for i, text in enumerate(comments):
+        sh = shingles(text)
+        if any(jaccard(sh, c["sh"]) >= PACK_NEAR_DUP for c in cands):
+            continue  # duplicate of an earlier (higher-ranked) comment
+        cands.append({"i": i, "text": text, "sh": sh, "tokens": estimate_tokens(text)})
+
+    substantive = [c for c in cands if len(c["text"]) >= PACK_MIN_COMMENT_CHARS]
+    pool = substantive or cands
+
+    chosen: list[dict] = []
+    used = 0
+    while pool:
+        def score(c: dict) -> float:
+            # Longer comments carry more argument, with diminishing returns;
+            # overlap with what is already chosen is penalized; earlier
+            # (more relevant) comments win ties.
+            novelty = 1.0 - max((jaccard(c["sh"], s["sh"]) for s in chosen), default=0.0)
+            return math.log1p(c["tokens"]) * novelty - c["i"] * 1e-3
+
+        best = max(pool, key=score)
+        pool.remove(best)
+        if used + best["tokens"] > budget:
+            continue
+        chosen.append(best)
+        used += best["tokens"]
+
+    return [c["text"] for c in sorted(chosen, key=lambda c: c["i"])]
+
+
+def trim_text(text: str, budget: int) -> str:
+    """Cut text to budget tokens at a paragraph boundary, falling back to sentences."""
+    if estimate_tokens(text) <= budget:
+        return text
+    out: list[str] = []
+    used = 0
+    for para in re.split(r"\n\s*\n", text):
+        t = estimate_tokens(para)
+        if used + t <= budget:
+            out.append(para)
+            used += t
+            continue
+        if not out:
+            # Even the first paragraph is too long: keep whole sentences of it
+            for sent in _SENTENCE_END.split(para):
+                st = estimate_tokens(sent)
+                if used + st > budget:
+                    break
+                out.append(sent)
+                used += st
+            if not out:
+                # One giant sentence: hard cut at the paragraph's chars-per-token ratio
+                return para[: int(budget * len(para) / estimate_tokens(para))]
+            return " ".join(out)
+        break
+    return "\n\n".join(out)
+
+
+def pack_item(it: dict, budget: int = PACK_TOKEN_BUDGET) -> dict:
+    """Pack one item's source_text and comment_texts into budget tokens (in place)."""
+    if budget <= 0:
+        return it
+    source = it.get("source_text") or ""
+    comments = it.get("comment_texts") or []
+
+    article_budget = int(budget * PACK_ARTICLE_SHARE)
+    comment_tokens = sum(estimate_tokens(c) for c in comments)
+    # Let the article use whatever the comments don't need
+    article_budget = max(article_budget, budget - comment_tokens)
+    source = trim_text(source, article_budget)
+    comments = select_comments(comments, budget - estimate_tokens(source))
+
+    it["source_text"] = source
+    it["comment_texts"] = comments
+    it["comment_count_packed"] = len(comments)
+    it["input_tokens_est"] = estimate_tokens(source) + sum(estimate_tokens(c) for c in comments)
+    return it
+
+
+def main() -> None:
+    if PACK_TOKEN_BUDGET <= 0:
+        print("[pack] PACK_TOKEN_BUDGET=0, skipping")
+        return
+    if use_sqlite():
+        store = StateStore()
+        hn = store.load_run()
+        for it in hn.get("items", []):
+            pack_item(it)
+            store.put_fetched(hn["date"], it)
+        tokens = [it.get("input_tokens_est", 0) for it in hn.get("items", [])]
+        print(f"[pack] Wrote {STATE_DB} (budget={PACK_TOKEN_BUDGET}, max_item_tokens={max(tokens, default=0)})")
+        return
+
+    header, items = read_artifact(INPUT_FILE)
+    out = ArtifactWriter(
+        INPUT_FILE,
+        {**header, "stage": "pack_input", "budget": PACK_TOKEN_BUDGET},
+    )
+    done = {str(it.get("hn_id", "")) for it in out.completed()}
+    max_tokens = 0
+    for it in items:
+        if str(it.get("hn_id", "")) not in done:
+            out.write(pack_item(it))
+            max_tokens = max(max_tokens, it.get("input_tokens_est", 0))
+    out.commit()
+    print(f"[pack] Wrote {INPUT_FILE} (budget={PACK_TOKEN_BUDGET}, max_item_tokens={max_tokens})")
+
+
+if __name__ == "__main__":
+    with span("stage", stage="pack_input"):
+        main()
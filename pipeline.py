@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Single-process streaming runner for the whole digest.
+
+Runs fetch_hn -> fetch_article_text -> pack_input -> summarize ->
+build_slack_payload -> post_to_slack in one interpreter. Fetching and
+summarizing are connected by a bounded queue, so item k is summarized
+while item k+1 is still being fetched; data is handed over in memory.
+
+Set PIPELINE_WRITE_ARTIFACTS=true to also write the usual intermediate
+files (data/hn_with_text.jsonl, data/summaries.jsonl,
+out/slack_payload_*.json) for debugging. With STATE_BACKEND=sqlite the
+stage rows are recorded in the state database as they are produced.
+"""
+import os
+import queue
+import sys
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import build_slack_payload  # noqa: E402
+import fetch_article_text  # noqa: E402
+import fetch_hn  # noqa: E402
+import pack_input  # noqa: E402
+import post_to_slack  # noqa: E402
+import summarize  # noqa: E402
+from artifacts import stories_id, write_artifact  # noqa: E402
+from state_store import StateStore, use_sqlite  # noqa: E402
+from tracing import span  # noqa: E402
+
+PIPELINE_QUEUE_SIZE = max(1, int(os.getenv("PIPELINE_QUEUE_SIZE", "4")))
+PIPELINE_WRITE_ARTIFACTS = os.getenv("PIPELINE_WRITE_ARTIFACTS", "").lower() in ("1", "true", "yes")
+
+_DONE = object()
+
+
+def _produce(hn: dict, q: queue.Queue, errors: list, store: StateStore | None) -> None:
+    try:
+        for it in fetch_article_text.iter_fetched_items(hn["items"]):
+            pack_input.pack_item(it)
+            if store:
+                store.put_fetched(hn["date"], it)
+            q.put(it)
+    except BaseException as e:  # surfaced by the consumer
+        errors.append(e)
+    finally:
+        q.put(_DONE)
+
+
+def _consume(q: queue.Queue):
+    while True:
+        it = q.get()
+        if it is _DONE:
+            return
+        yield it
+
+
+def main() -> None:
+    print("[pipeline] Fetch HN...")
+    with span("stage", stage="fetch_hn"):
+        hn = fetch_hn.fetch_front_page()
+    items = hn["items"]
+
+    print(f"[pipeline] Fetch + summarize {len(items)} items (streaming)...")
+    q: queue.Queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    errors: list = []
+    store = StateStore() if use_sqlite() else None
+    producer = threading.Thread(target=_produce, args=(hn, q, errors, store), daemon=True)
+    # Fetching and summarizing overlap, so they are timed as one stage
+    with span("stage", stage="fetch+summarize"):
+        producer.start()
+        sm = summarize.summarize_all(_consume(q), hn, len(items))
+        producer.join()
+    if errors:
+        raise errors[0]
+    if store:
+        store.put_summaries(hn["date"], sm["lang"], sm["items"])
+
+    if PIPELINE_WRITE_ARTIFACTS:
+        date_str = hn["date"]
+        write_artifact(
+            fetch_article_text.OUTPUT_FILE,
+            {"stage": "pipeline", "date": date_str, "total": len(items), "stories": stories_id(items)},
+            items,
+        )
+        write_artifact(
+            summarize.OUTPUT_FILE,
+            {"stage": "pipeline", "date": date_str, "lang": sm["lang"]},
+            sm["items"],
+        )
+
+    if summarize.POST_EACH:
+        print("[pipeline] POST_EACH=true: skipping digest post.")
+        return
+
+    with span("stage", stage="build_slack_payload"):
+        payloads, today = build_slack_payload.build_payloads(hn, sm)
+    if PIPELINE_WRITE_ARTIFACTS:
+        print(f"[pipeline] Wrote {build_slack_payload.write_payloads(payloads, today)}")
+
+    if not post_to_slack.WEBHOOK:
+        print("SLACK_WEBHOOK_URL is not set. Skipping post.", file=sys.stderr)
+        return
+    with span("stage", stage="post_to_slack"):
+        post_to_slack.post_payloads(payloads, run_key=f"slack_payload_{today}.json")
+    fetch_hn.mark_emitted(items)
+    print("[pipeline] Done.")
+
+
+if __name__ == "__main__":
+    main()
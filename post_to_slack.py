@@ -1,20 +1,202 @@
 #!/usr/bin/env python3
+"""Deliver Slack payloads through an Incoming Webhook.
+
+Messages go through one keep-alive session and a token-bucket rate
+limiter (SLACK_POST_DELAY seconds per message, SLACK_RATE_BURST burst).
+429 responses pause the bucket for Retry-After; 5xx and connection errors
+back off exponentially up to SLACK_RETRY_MAX times. Every delivered
+message is recorded in a ledger (data/slack_ledger.json, or the state
+database with STATE_BACKEND=sqlite) by run key (the payload file name,
+one per day) and position, so re-running after a failure resumes with
+the first undelivered message instead of double-posting, even though the
+re-run re-renders the messages with new counts.
+"""
+import hashlib
 import json
 import os
 import sys
+import threading
 import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
 import requests
 from dotenv import load_dotenv
 
+from state_store import StateStore, use_sqlite
+from tracing import span
+
 load_dotenv()
 WEBHOOK = os.getenv("SLACK_WEBHOOK_URL", "").strip()
 TIMEOUT = int(os.getenv("REQUEST_TIMEOUT_SEC", "15"))
 SLACK_POST_DELAY = float(os.getenv("SLACK_POST_DELAY", "1"))
+SLACK_RATE_BURST = max(1, int(os.getenv("SLACK_RATE_BURST", "1")))
+SLACK_RETRY_MAX = int(os.getenv("SLACK_RETRY_MAX", "5"))
+SLACK_BACKOFF_BASE = float(os.getenv("SLACK_BACKOFF_BASE", "1"))
+SLACK_LEDGER_FILE = os.getenv("SLACK_LEDGER_FILE", "data/slack_ledger.json")
+
+
+class SlackDeliveryError(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, interval: float, burst: int):
+        self.interval = interval
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a message may be sent."""
+        with self.lock:
+            while True:
+                now = time.monotonic()
+                if self.interval > 0:
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+                else:
+                    self.tokens = self.burst
+                self.updated = now
+                wait = max(self.blocked_until - now, (1 - self.tokens) * self.interval)
+                if wait <= 0:
+                    self.tokens -= 1
+                    return
+                time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Hold all sends for seconds (Slack's Retry-After)."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class DeliveryLedger:
+    """Which messages of a payload set (run_key, seq) were already delivered."""
+
+    def __init__(self, path: str = SLACK_LEDGER_FILE):
+        self.path = path
+        self.store = StateStore() if use_sqlite() else None
+        self.entries: dict[str, str] = {}
+        if not self.store and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def delivered(self, run_key: str, seq: int, text: str | None) -> bool:
+        """Whether (run_key, seq) was posted; with text, only if it was this exact text."""
+        if self.store:
+            return self.store.was_posted(run_key, seq, text)
+        entry = self.entries.get(f"{run_key}#{seq}")
+        return entry is not None and (text is None or entry == _text_hash(text))
+
+    def record(self, run_key: str, seq: int, text: str) -> None:
+        if self.store:
+            self.store.mark_posted(run_key, seq, text)
+            return
+        self.entries[f"{run_key}#{seq}"] = _text_hash(text)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _retry_after(value: str | None) -> float:
+    """Seconds to wait from a Retry-After header (seconds or HTTP-date); SLACK_BACKOFF_BASE if unusable."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return SLACK_BACKOFF_BASE
+
+
+class SlackClient:
+    def __init__(self, webhook: str = WEBHOOK):
+        self.webhook = webhook
+        self.session = requests.Session()
+        self.bucket = TokenBucket(SLACK_POST_DELAY, SLACK_RATE_BURST)
+        self.ledger = DeliveryLedger()
+
+    def post(self, payload: dict) -> None:
+        """Send one message, retrying 429 / 5xx / connection errors."""
+        size = len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        with span("slack.post", domain=urlparse(self.webhook).netloc, bytes=size) as sp:
+            self._post(payload, sp)
+
+    def _post(self, payload: dict, sp: dict) -> None:
+        for attempt in range(SLACK_RETRY_MAX + 1):
+            sp["retries"] = attempt
+            self.bucket.acquire()
+            try:
+                r = self.session.post(self.webhook, json=payload, timeout=TIMEOUT)
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {e}"
+            else:
+                sp["status"] = r.status_code
+                if r.status_code < 400:
+                    return
+                error = f"{r.status_code} {r.text[:200]}"
+                if r.status_code == 429:
+                    retry_after = _retry_after(r.headers.get("Retry-After"))
+                    print(f"  [slack] rate limited, waiting {retry_after:.1f}s", file=sys.stderr)
+                    self.bucket.pause(retry_after)
+                    continue
+                if r.status_code < 500:
+                    raise SlackDeliveryError(f"Slack webhook failed: {error}")
+            if attempt < SLACK_RETRY_MAX:
+                delay = SLACK_BACKOFF_BASE * 2 ** attempt
+                print(f"  [slack] {error}; retrying in {delay:.1f}s", file=sys.stderr)
+                self.bucket.pause(delay)
+        raise SlackDeliveryError(f"Slack webhook failed after {SLACK_RETRY_MAX} retries: {error}")
+
+    def post_all(self, payloads: list[dict], run_key: str, match_text: bool = False) -> int:
+        """Post payloads in order, skipping ones the ledger has. Returns how many were sent.
+
+        A message counts as delivered once anything was posted at its
+        (run_key, seq): a re-run re-renders the digest with new points /
+        comment counts, which must not post it again. With match_text=True
+        only the exact same text counts.
+        """
+        # Same payload file to a different webhook is a different delivery
+        key = f"{run_key}@{_text_hash(self.webhook)[:12]}"
+        sent = 0
+        for i, p in enumerate(payloads):
+            text = json.dumps(p, ensure_ascii=False, sort_keys=True)
+            if self.ledger.delivered(key, i, text if match_text else None):
+                print(f"Message {i + 1}/{len(payloads)} already posted, skipping.")
+                continue
+            print(f"Posting message {i + 1}/{len(payloads)}...")
+            self.post(p)
+            self.ledger.record(key, i, text)
+            sent += 1
+        return sent
+
+
+_clients: dict[str, SlackClient] = {}
+
+
+def get_client(webhook: str = WEBHOOK) -> SlackClient:
+    """Shared client per webhook, so the rate limit spans all callers in a process."""
+    if webhook not in _clients:
+        _clients[webhook] = SlackClient(webhook)
+    return _clients[webhook]
+
 
 def post_one(payload: dict) -> None:
-    r = requests.post(WEBHOOK, json=payload, timeout=TIMEOUT)
-    if r.status_code >= 400:
-        raise SystemExit(f"Slack webhook failed: {r.status_code} {r.text}")
+    get_client().post(payload)
+
+def post_payloads(payload: list[dict] | dict, run_key: str = "") -> None:
+    # Support both list (new) and dict (legacy) formats
+    payloads = payload if isinstance(payload, list) else [payload]
+    sent = get_client().post_all(payloads, run_key or "default")
+    print(f"Posted {sent} message(s) to Slack ({len(payloads) - sent} already delivered).")
 
 def main() -> None:
     if not WEBHOOK:
@@ -26,17 +208,18 @@ def main() -> None:
     with open(path, encoding="utf-8") as f:
         payload = json.load(f)
 
-    # Support both list (new) and dict (legacy) formats
-    if isinstance(payload, list):
-        for i, p in enumerate(payload):
-            if i > 0:
-                time.sleep(SLACK_POST_DELAY)
-            print(f"Posting message {i + 1}/{len(payload)}...")
-            post_one(p)
-        print(f"Posted {len(payload)} message(s) to Slack.")
-    else:
-        post_one(payload)
-        print("Posted to Slack.")
+    try:
+        post_payloads(payload, run_key=os.path.basename(path))
+    except SlackDeliveryError as e:
+        # Already-delivered messages are in the ledger; a re-run resumes here.
+        raise SystemExit(str(e))
+
+    # Only now does delta mode (HN_DELTA) treat the stories in this payload as sent
+    from build_slack_payload import read_payload_stories
+    from fetch_hn import mark_emitted
+
+    mark_emitted(read_payload_stories(path))
 
 if __name__ == "__main__":
-    main()
+    with span("stage", stage="post_to_slack"):
+        main()
@@ -40,12 +40,36 @@ if [[ ! -f "$PROMPT_FILE" ]]; then
   exit 1
 fi
 
+# All stages of this run append their spans to data/traces/$TRACE_RUN_ID.jsonl
+export TRACE_RUN_ID="${TRACE_RUN_ID:-$(date +%Y%m%d-%H%M%S)}"
+
+# PIPELINE=true: run every stage in one streaming Python process instead
+if [[ "${PIPELINE:-}" =~ ^(1|true|yes)$ ]]; then
+  echo "[hn-bot] Run streaming pipeline..."
+  "$PY" pipeline.py
+  "$PY" tracing.py "$TRACE_RUN_ID" || true
+  echo "[hn-bot] Done."
+  exit 0
+fi
+
+# FANOUT=true: one fetch/summarize pass, one digest per target in $FANOUT_FILE
+if [[ "${FANOUT:-}" =~ ^(1|true|yes)$ ]]; then
+  echo "[hn-bot] Run fan-out..."
+  "$PY" fanout.py
+  "$PY" tracing.py "$TRACE_RUN_ID" || true
+  echo "[hn-bot] Done."
+  exit 0
+fi
+
 echo "[hn-bot] Fetch HN..."
 "$PY" fetch_hn.py
 
 echo "[hn-bot] Fetch article text + HN comments..."
 "$PY" fetch_article_text.py
 
+echo "[hn-bot] Pack summarizer input into token budget..."
+"$PY" pack_input.py
+
 echo "[hn-bot] Summarize via Codex (needs prior login)..."
 "$PY" summarize.py
 
@@ -59,4 +83,6 @@ else
   "$PY" post_to_slack.py "$PAYLOAD_PATH"
 fi
 
+"$PY" tracing.py "$TRACE_RUN_ID" || true
+
 echo "[hn-bot] Done."
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""SQLite-backed run state (STATE_BACKEND=sqlite).
+
+Replaces the data/*.json hand-off files with one WAL-mode database so each
+stage reads and writes only the rows it touches:
+
+  stories    front-page snapshot per run date (rank, title, url, points, ...)
+  bodies     fetched article text + per-item fetch metadata
+  comments   comment texts passed to the summarizer, in order
+  summaries  codex output per story and language
+  posted     Slack messages already delivered
+
+Rows are keyed by (run_date, hn_id); hn_id is indexed on its own for
+cross-day lookups.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json").strip().lower()
+STATE_DB = os.getenv("STATE_DB", "data/state.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stories (
+    run_date TEXT NOT NULL,
+    hn_id TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    title TEXT,
+    url TEXT,
+    points INTEGER,
+    comments INTEGER,
+    extra TEXT,
+    PRIMARY KEY (run_date, hn_id)
+);
+CREATE INDEX IF NOT EXISTS stories_hn_id ON stories (hn_id);
+
+CREATE TABLE IF NOT EXISTS bodies (
+    run_date TEXT NOT NULL,
+    hn_id TEXT NOT NULL,
+    domain TEXT,
+    body_source TEXT,
+    source_text TEXT,
+    meta TEXT,
+    fetched_at REAL,
+    PRIMARY KEY (run_date, hn_id)
+);
+CREATE INDEX IF NOT EXISTS bodies_hn_id ON bodies (hn_id);
+
+CREATE TABLE IF NOT EXISTS comments (
+    run_date TEXT NOT NULL,
+    hn_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (run_date, hn_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    run_date TEXT NOT NULL,
+    hn_id TEXT NOT NULL,
+    lang TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    created_at REAL,
+    PRIMARY KEY (run_date, hn_id, lang)
+);
+CREATE INDEX IF NOT EXISTS summaries_hn_id ON summaries (hn_id);
+
+CREATE TABLE IF NOT EXISTS posted (
+    run_key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    text_hash TEXT NOT NULL,
+    posted_at REAL,
+    PRIMARY KEY (run_key, seq)
+);
+"""
+
+# Item keys stored in dedicated columns; anything else goes to a JSON column
+_STORY_COLS = ("hn_id", "title", "url", "points", "comments")
+_BODY_COLS = ("domain", "body_source", "source_text", "comment_texts")
+
+
+class StateStore:
+    def __init__(self, path: str = STATE_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def latest_run_date(self) -> str | None:
+        row = self.conn.execute("SELECT MAX(run_date) FROM stories").fetchone()
+        return row[0]
+
+    # ---- stories (fetch_hn) ----
+    def put_stories(self, run_date: str, items: list[dict]) -> None:
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM stories WHERE run_date = ?", (run_date,))
+            self.conn.executemany(
+                "INSERT INTO stories VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        run_date, str(it.get("hn_id", "")), rank,
+                        it.get("title"), it.get("url"), it.get("points"), it.get("comments"),
+                        json.dumps({k: v for k, v in it.items() if k not in _STORY_COLS}, ensure_ascii=False),
+                    )
+                    for rank, it in enumerate(items)
+                ],
+            )
+
+    # ---- bodies + comments (fetch_article_text, pack_input) ----
+    def put_fetched(self, run_date: str, it: dict) -> None:
+        hn_id = str(it.get("hn_id", ""))
+        meta = {k: v for k, v in it.items() if k not in _STORY_COLS and k not in _BODY_COLS}
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO bodies VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_date, hn_id, it.get("domain"), it.get("body_source"), it.get("source_text"),
+                    json.dumps(meta, ensure_ascii=False), time.time(),
+                ),
+            )
+            self.conn.execute(
+                "DELETE FROM comments WHERE run_date = ? AND hn_id = ?", (run_date, hn_id)
+            )
+            self.conn.executemany(
+                "INSERT INTO comments VALUES (?, ?, ?, ?)",
+                [(run_date, hn_id, i, t) for i, t in enumerate(it.get("comment_texts") or [])],
+            )
+
+    def load_items(self, run_date: str) -> list[dict]:
+        """Items of run_date in front-page order, with body/comment fields if fetched."""
+        rows = self.conn.execute(
+            "SELECT s.*, b.domain, b.body_source, b.source_text, b.meta, b.hn_id AS fetched "
+            "FROM stories s LEFT JOIN bodies b ON b.run_date = s.run_date AND b.hn_id = s.hn_id "
+            "WHERE s.run_date = ? ORDER BY s.rank",
+            (run_date,),
+        ).fetchall()
+        comments: dict[str, list[str]] = {}
+        for r in self.conn.execute(
+            "SELECT hn_id, text FROM comments WHERE run_date = ? ORDER BY hn_id, position",
+            (run_date,),
+        ):
+            comments.setdefault(r["hn_id"], []).append(r["text"])
+
+        items = []
+        for r in rows:
+            it = {k: r[k] for k in _STORY_COLS}
+            it.update(json.loads(r["extra"] or "{}"))
+            if r["fetched"] is not None:
+                it.update(json.loads(r["meta"] or "{}"))
+                it["domain"] = r["domain"]
+                it["body_source"] = r["body_source"]
+                it["source_text"] = r["source_text"]
+                it["comment_texts"] = comments.get(r["hn_id"], [])
+            items.append(it)
+        return items
+
+    def load_run(self, run_date: str | None = None) -> dict:
+        """{"date", "items"} for run_date (default: latest), like data/hn_with_text.json."""
+        run_date = run_date or self.latest_run_date() or ""
+        return {"date": run_date, "items": self.load_items(run_date)}
+
+    # ---- summaries (summarize) ----
+    def put_summaries(self, run_date: str, lang: str, summaries: list[dict]) -> None:
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?, ?)",
+                [
+                    (run_date, str(s.get("hn_id", "")), lang, json.dumps(s, ensure_ascii=False), now)
+                    for s in summaries
+                ],
+            )
+
+    def load_summaries(self, run_date: str, lang: str) -> dict:
+        """{"date", "lang", "items"} like data/summaries.json, in front-page order.
+
+        Only stories of the current run: an earlier run on the same day may
+        have summarized stories that have since left the front page.
+        """
+        rows = self.conn.execute(
+            "SELECT m.summary FROM summaries m "
+            "JOIN stories s ON s.run_date = m.run_date AND s.hn_id = m.hn_id "
+            "WHERE m.run_date = ? AND m.lang = ? ORDER BY s.rank",
+            (run_date, lang),
+        ).fetchall()
+        return {"date": run_date, "lang": lang, "items": [json.loads(r[0]) for r in rows]}
+
+    # ---- posted messages (post_to_slack) ----
+    def was_posted(self, run_key: str, seq: int, text: str | None) -> bool:
+        row = self.conn.execute(
+            "SELECT text_hash FROM posted WHERE run_key = ? AND seq = ?", (run_key, seq)
+        ).fetchone()
+        return row is not None and (text is None or row[0] == _text_hash(text))
+
+    def mark_posted(self, run_key: str, seq: int, text: str) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO posted VALUES (?, ?, ?, ?)",
+                (run_key, seq, _text_hash(text), time.time()),
+            )
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def use_sqlite() -> bool:
+    return STATE_BACKEND == "sqlite"
@@ -1,125 +1,424 @@
 #!/usr/bin/env python3
 """Per-item codex exec wrapper.
 
-Reads data/hn_with_text.json, calls codex exec once per item,
-merges results into data/summaries.json.
+Reads data/hn_with_text.jsonl, calls codex exec once per item and
+appends each summary to data/summaries.jsonl as it completes; an
+interrupted run resumes with the items not summarized yet (artifacts.py).
+
+Set SUMMARIZER_BACKEND=openai to call an OpenAI-compatible
+chat/completions API instead of spawning codex (see llm_api.py).
+
+Set SUMMARIZE_BATCH_SIZE=K to send K items per codex exec call instead;
+a failed or partial batch is split in half and retried.
+
+Set PROMPT_INPUT=inline to embed each item's compact JSON in the prompt
+(at its {{input_json}} placeholder) instead of having codex read a temp
+input file (named at {{input_ref}}).
 
 Set POST_EACH=true to post each summarized item to Slack immediately.
+Set SUMMARIZE_CONCURRENCY=N to run up to N codex exec processes at once;
+results are still merged (and posted) in the original item order.
+Previously summarized, unchanged items are served from the summary cache
+(see summary_cache.py; SUMMARY_CACHE=false disables it).
 """
 import glob
 import json
 import os
+import queue
+import re
 import subprocess
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Iterable, Iterator
 
-import requests
 from dotenv import load_dotenv
 
+from artifacts import ArtifactWriter, read_artifact
+from codex_latency import LatencyStats
+from fetch_hn import mark_emitted
+from llm_api import ChatCompletionsBackend
+from post_to_slack import SlackDeliveryError, get_client
+from state_store import STATE_DB, StateStore, use_sqlite
+from summary_cache import SUMMARY_CACHE, SummaryCache
+from tracing import span
+
 load_dotenv()
 
+# codex: one `codex exec` process per call; openai: chat/completions HTTP API (llm_api.py)
+SUMMARIZER_BACKEND = os.getenv("SUMMARIZER_BACKEND", "codex").strip().lower()
+CODEX_BIN = os.getenv("CODEX_BIN", "codex")
 CODEX_RETRY_MAX = int(os.getenv("CODEX_RETRY_MAX", "2"))
-CODEX_TIMEOUT = int(os.getenv("CODEX_TIMEOUT", "300"))  # 5 minutes
+CODEX_TIMEOUT = int(os.getenv("CODEX_TIMEOUT", "300"))  # 5 minutes; upper bound once latencies are known
+# Start a second, concurrent codex attempt when one runs past the usual p95 (codex_latency.py)
+CODEX_HEDGE = os.getenv("CODEX_HEDGE", "true").lower() in ("1", "true", "yes")
+SUMMARIZE_CONCURRENCY = max(1, int(os.getenv("SUMMARIZE_CONCURRENCY", "1")))
+SUMMARIZE_BATCH_SIZE = max(1, int(os.getenv("SUMMARIZE_BATCH_SIZE", "1")))
 PROMPT_LANG = os.getenv("PROMPT_LANG", "en")
 PROMPT_FILE = os.getenv("PROMPT_FILE", f"prompts/{PROMPT_LANG}.txt")
+# file: codex reads a temp input file named by {{input_ref}};
+# inline: the compact item JSON replaces {{input_json}} (prompt sent on stdin)
+PROMPT_INPUT = os.getenv("PROMPT_INPUT", "file").strip().lower()
 
 POST_EACH = os.getenv("POST_EACH", "").lower() in ("1", "true", "yes")
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL", "").strip()
-SLACK_POST_DELAY = float(os.getenv("SLACK_POST_DELAY", "1"))
-REQUEST_TIMEOUT_SEC = int(os.getenv("REQUEST_TIMEOUT_SEC", "15"))
 
 DATA_DIR = Path("data")
 PARTS_DIR = DATA_DIR / "_summaries_parts"
 SCHEMA_FILE = Path("schema.json")
-OUTPUT_FILE = DATA_DIR / "summaries.json"
+INPUT_FILE = DATA_DIR / "hn_with_text.jsonl"
+OUTPUT_FILE = DATA_DIR / "summaries.jsonl"
 
 # Lazy import to avoid circular dependency at module level
 def _get_formatters():
-    from build_slack_payload import format_item, labels  # noqa: PLC0415
-    return format_item, labels
+    from build_slack_payload import format_item, format_related_item, labels  # noqa: PLC0415
+    return format_item, format_related_item, labels
+
+
+def story_numbers(items: Iterable[dict], numbers: dict[str, int]) -> Iterator[dict]:
+    """Pass items through, numbering the non-duplicate ones in numbers[hn_id] as the digest does."""
+    n = 0
+    for it in items:
+        if not it.get("duplicate_of"):
+            n += 1
+            numbers[str(it.get("hn_id", ""))] = n
+        yield it
+
 
+def post_item_to_slack(item: dict, summary: dict | None, idx: int, total: int, date_str: str = "") -> bool:
+    """Post a single summarized item to Slack immediately; True once it is delivered.
 
-def post_item_to_slack(item: dict, summary: dict, idx: int, total: int) -> None:
-    """Post a single summarized item to Slack immediately."""
+    idx is the story's number in the digest (see story_numbers). A
+    duplicate (summary None) is posted as a related link, as the digest
+    shows it under its representative. Goes through post_to_slack's
+    rate-limited client and ledger, so a re-run does not post the same
+    item twice.
+    """
     if not SLACK_WEBHOOK_URL:
         print("  [slack] SLACK_WEBHOOK_URL not set, skipping", file=sys.stderr)
-        return
-    format_item, labels = _get_formatters()
+        return False
+    format_item, format_related_item, labels = _get_formatters()
     lang = "ja" if "ja" in PROMPT_LANG else "en"
     L = labels(lang)
-    text = format_item(idx, item, summary, L)
+    text = format_related_item(item, L) if item.get("duplicate_of") else format_item(idx, item, summary, L)
     try:
-        r = requests.post(SLACK_WEBHOOK_URL, json={"text": text}, timeout=REQUEST_TIMEOUT_SEC)
-        if r.status_code >= 400:
-            print(f"  [slack] webhook failed: {r.status_code} {r.text}", file=sys.stderr)
-        else:
-            print(f"  [slack] posted item {idx}/{total}")
-    except Exception as e:
-        print(f"  [slack] error posting: {e}", file=sys.stderr)
-
-
-def load_prompt() -> str:
-    with open(PROMPT_FILE, encoding="utf-8") as f:
-        return f.read()
-
-
-def make_single_item_input(item: dict, idx: int, hn_meta: dict) -> Path:
-    """Create a temp input JSON containing only one item."""
-    single = {
+        run_key = f"item_{date_str}_{item.get('hn_id', idx)}"
+        # The story's counts change between runs; one post per story and day
+        if get_client(SLACK_WEBHOOK_URL).post_all([{"text": text}], run_key):
+            print(f"  [slack] posted {'related link' if item.get('duplicate_of') else f'item {idx}/{total}'}")
+        return True
+    except SlackDeliveryError as e:
+        print(f"  [slack] {e}", file=sys.stderr)
+        return False
+
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+PROMPT_PLACEHOLDERS = ("input_ref", "input_json")
+# Prompts written before placeholders named the input file literally
+LEGACY_INPUT_PATH = "data/hn_with_text.json"
+INLINE_INPUT_REF = "the input JSON at the end of this prompt"
+
+
+def load_prompt(prompt_lang: str = PROMPT_LANG) -> str:
+    """Prompt template; exits if its placeholders don't fit PROMPT_INPUT."""
+    # Other languages: <lang>.txt next to PROMPT_FILE
+    path = PROMPT_FILE if prompt_lang == PROMPT_LANG else Path(PROMPT_FILE).with_name(f"{prompt_lang}.txt")
+    with open(path, encoding="utf-8") as f:
+        prompt = f.read()
+    if not _PLACEHOLDER.search(prompt):
+        prompt = prompt.replace(LEGACY_INPUT_PATH, "{{input_ref}}")
+    names = set(_PLACEHOLDER.findall(prompt))
+    unknown = names - set(PROMPT_PLACEHOLDERS)
+    if unknown:
+        raise SystemExit(f"{path}: unknown placeholder(s) {sorted(unknown)} (known: {list(PROMPT_PLACEHOLDERS)})")
+    if PROMPT_INPUT not in ("file", "inline"):
+        raise SystemExit(f"PROMPT_INPUT must be file or inline, not {PROMPT_INPUT!r}")
+    needed = "input_json" if PROMPT_INPUT == "inline" else "input_ref"
+    if SUMMARIZER_BACKEND == "codex" and needed not in names:
+        raise SystemExit(f"{path}: PROMPT_INPUT={PROMPT_INPUT} needs a {{{{{needed}}}}} placeholder")
+    return prompt
+
+
+def render_prompt(prompt: str, input_ref: str, input_json: str = "") -> str:
+    """Fill the placeholders of a load_prompt() template (in one pass, so item text is left alone)."""
+    values = {"input_ref": input_ref, "input_json": input_json}
+    return _PLACEHOLDER.sub(lambda m: values[m.group(1)], prompt)
+
+
+def make_batch_input(batch: list[dict], tag: str, hn_meta: dict) -> Path:
+    """Create a temp input JSON containing the given items."""
+    payload = {
         "date": hn_meta.get("date", ""),
-        "items": [item],
+        "items": batch,
     }
-    path = DATA_DIR / f"_batch_input_{idx:03d}.json"
+    path = DATA_DIR / f"_batch_input_{tag}.json"
     with open(path, "w", encoding="utf-8") as f:
-        json.dump(single, f, ensure_ascii=False, indent=2)
+        json.dump(payload, f, ensure_ascii=False, indent=2)
     return path
 
 
-def run_codex_for_item(prompt: str, input_path: Path, output_path: Path) -> dict | None:
-    """Run codex exec for a single item. Returns parsed JSON or None."""
-    modified_prompt = prompt.replace("data/hn_with_text.json", str(input_path))
-
-    for attempt in range(1, CODEX_RETRY_MAX + 1):
-        try:
-            result = subprocess.run(
-                [
-                    "codex", "exec", modified_prompt,
-                    "--output-schema", str(SCHEMA_FILE),
-                    "-o", str(output_path),
-                    "--full-auto",
-                ],
-                capture_output=True,
-                text=True,
-                timeout=CODEX_TIMEOUT,
-            )
-            if result.returncode == 0 and output_path.exists():
-                with open(output_path, encoding="utf-8") as f:
-                    return json.load(f)
-            print(
-                f"  [attempt {attempt}/{CODEX_RETRY_MAX}] codex exec failed "
-                f"(rc={result.returncode})",
-                file=sys.stderr,
-            )
-            if result.stderr:
-                print(f"    stderr: {result.stderr[:500]}", file=sys.stderr)
-        except subprocess.TimeoutExpired:
-            print(
-                f"  [attempt {attempt}/{CODEX_RETRY_MAX}] codex exec timed out "
-                f"({CODEX_TIMEOUT}s)",
-                file=sys.stderr,
-            )
-        except Exception as e:
-            print(
-                f"  [attempt {attempt}/{CODEX_RETRY_MAX}] error: {e}",
-                file=sys.stderr,
-            )
-
+class _CodexAttempt(threading.Thread):
+    """One `codex exec` process, run on its own thread so a hedge can overlap it."""
+
+    def __init__(
+        self,
+        cmd: list[str],
+        output_path: Path,
+        attempt: int,
+        timeout: float,
+        hedge: bool,
+        done: queue.Queue,
+        stdin: str | None = None,
+    ):
+        super().__init__(daemon=True)
+        self.cmd = cmd
+        self.stdin = stdin
+        self.output_path = output_path
+        self.attempt = attempt
+        self.timeout = timeout
+        self.hedge = hedge
+        self.done = done
+        self.proc: subprocess.Popen | None = None
+        self.cancelled = False
+        self.result: dict | None = None
+        self.started = 0.0
+        self.elapsed = 0.0
+        self.timed_out = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+
+    def run(self) -> None:
+        # Never mistake a previous attempt's (or run's) output for this one.
+        self.output_path.unlink(missing_ok=True)
+        tag = f"[attempt {self.attempt}{' hedge' if self.hedge else ''}]"
+        self.started = t0 = time.perf_counter()
+        attrs = {"part": self.output_path.stem, "attempt": self.attempt, "timeout": round(self.timeout, 1)}
+        with span("codex", **attrs, hedge=self.hedge) as sp:
+            try:
+                self.proc = subprocess.Popen(
+                    self.cmd,
+                    stdin=subprocess.PIPE if self.stdin is not None else None,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                )
+                if self.cancelled:
+                    self.proc.kill()
+                try:
+                    _, stderr = self.proc.communicate(self.stdin, timeout=self.timeout)
+                except subprocess.TimeoutExpired:
+                    self.proc.kill()
+                    self.proc.communicate()
+                    sp["error"] = "timeout"
+                    self.timed_out = not self.cancelled
+                    print(f"  {tag} codex exec timed out ({self.timeout:.0f}s)", file=sys.stderr)
+                    return
+                sp["rc"] = self.proc.returncode
+                if self.cancelled:
+                    sp["error"] = "cancelled"
+                elif self.proc.returncode == 0 and self.output_path.exists():
+                    with open(self.output_path, encoding="utf-8") as f:
+                        self.result = json.load(f)
+                else:
+                    sp["error"] = "failed"
+                    print(f"  {tag} codex exec failed (rc={self.proc.returncode})", file=sys.stderr)
+                    if stderr:
+                        print(f"    stderr: {stderr[:500]}", file=sys.stderr)
+            except Exception as e:
+                sp["error"] = type(e).__name__
+                print(f"  {tag} error: {e}", file=sys.stderr)
+            finally:
+                self.elapsed = time.perf_counter() - t0
+                if self.cancelled or self.result is None:
+                    self.output_path.unlink(missing_ok=True)
+                self.done.put(self)
+
+
+def run_codex_for_item(
+    prompt: str,
+    size: int,
+    output_path: Path,
+    retries: int = CODEX_RETRY_MAX,
+    timeout: int = CODEX_TIMEOUT,
+    stdin: bool = False,
+) -> dict | None:
+    """Run codex exec on a rendered prompt. Returns parsed JSON or None.
+
+    size is the input's size in bytes (for the latency record). With stdin
+    the prompt is piped in (`codex exec -`) rather than passed as an
+    argument, which would hit the OS argument length limit for inline input.
+
+    Each of the retries rounds runs one attempt with a timeout taken from
+    the latency record (timeout is the upper bound); the last of several
+    rounds always gets the full timeout. A timed-out attempt is recorded
+    at its timeout, so the learned timeout grows if codex slows down. With
+    CODEX_HEDGE, an attempt still running after the usual p95 latency gets
+    a second, concurrent attempt; the first valid result wins and the
+    other process is killed. A winning hedge records the original
+    attempt's running time (a lower bound) rather than its own.
+    """
+    stats = get_latency_stats()
+    done: queue.Queue = queue.Queue()
+    for attempt in range(1, retries + 1):
+        running: list[_CodexAttempt] = []
+        last = retries > 1 and attempt == retries
+        attempt_timeout = timeout if last else stats.timeout(size, timeout)
+        hedge_after = stats.hedge_delay(size) if CODEX_HEDGE else None
+
+        def start(hedge: bool) -> None:
+            out = output_path.with_name(f"{output_path.stem}.hedge{output_path.suffix}") if hedge else output_path
+            cmd = [
+                CODEX_BIN, "exec", "-" if stdin else prompt,
+                "--output-schema", str(SCHEMA_FILE),
+                "-o", str(out),
+                "--full-auto",
+            ]
+            a = _CodexAttempt(cmd, out, attempt, attempt_timeout, hedge, done, prompt if stdin else None)
+            running.append(a)
+            a.start()
+
+        start(hedge=False)
+        hedged = False
+        while running:
+            try:
+                if hedge_after is not None and not hedged:
+                    finished = done.get(timeout=hedge_after)
+                else:
+                    finished = done.get()
+            except queue.Empty:
+                hedged = True
+                print(f"  [attempt {attempt}] no result after {hedge_after:.1f}s (p95), starting a hedge", file=sys.stderr)
+                start(hedge=True)
+                continue
+            running.remove(finished)
+            if finished.timed_out:
+                # Censored sample: the call took at least this long
+                stats.record(size, finished.timeout)
+            if finished.result is not None:
+                if not finished.hedge:
+                    stats.record(size, finished.elapsed)
+                else:
+                    # The hedge started late, so its own time says nothing about the
+                    # call's latency; the original had taken at least this long
+                    primary = [a for a in running if not a.hedge]
+                    if primary:
+                        stats.record(size, time.perf_counter() - primary[0].started)
+                for other in running:
+                    other.cancel()
+                return finished.result
     return None
 
 
+def run_backend(
+    prompt: str,
+    items: list[dict],
+    tag: str,
+    hn_meta: dict,
+    retries: int = CODEX_RETRY_MAX,
+    timeout: int = CODEX_TIMEOUT,
+) -> dict | None:
+    """Summarize items with SUMMARIZER_BACKEND. Returns parsed JSON or None."""
+    output_path = PARTS_DIR / f"part_{tag}.json"
+    if SUMMARIZER_BACKEND == "openai":
+        payload = {"date": hn_meta.get("date", ""), "items": items}
+        system = render_prompt(prompt, "the input JSON in the user message")
+        return get_llm_backend().summarize(system, payload, tag, retries, timeout)
+    if PROMPT_INPUT == "inline":
+        payload = json.dumps(
+            {"date": hn_meta.get("date", ""), "items": items}, ensure_ascii=False, separators=(",", ":")
+        )
+        rendered = render_prompt(prompt, INLINE_INPUT_REF, payload)
+        return run_codex_for_item(rendered, len(payload.encode("utf-8")), output_path, retries, timeout, stdin=True)
+    input_path = make_batch_input(items, tag, hn_meta)
+    rendered = render_prompt(prompt, str(input_path))
+    return run_codex_for_item(rendered, input_path.stat().st_size, output_path, retries, timeout)
+
+
+_latency_stats: LatencyStats | None = None
+_latency_stats_lock = threading.Lock()
+
+
+def get_latency_stats() -> LatencyStats:
+    global _latency_stats
+    with _latency_stats_lock:
+        if _latency_stats is None:
+            _latency_stats = LatencyStats()
+        return _latency_stats
+
+
+_llm_backend: ChatCompletionsBackend | None = None
+_llm_backend_lock = threading.Lock()
+
+
+def get_llm_backend() -> ChatCompletionsBackend:
+    """Shared HTTP backend, so all workers use one connection pool."""
+    global _llm_backend
+    with _llm_backend_lock:
+        if _llm_backend is None:
+            schema = json.loads(SCHEMA_FILE.read_text(encoding="utf-8"))
+            _llm_backend = ChatCompletionsBackend(schema, pool_size=SUMMARIZE_CONCURRENCY)
+        return _llm_backend
+
+
+def summarize_batch(prompt: str, batch: list[tuple[int, dict]], hn_meta: dict) -> dict[int, dict]:
+    """Summarize (num, item) pairs with as few codex exec calls as possible.
+
+    A single item gets the usual CODEX_RETRY_MAX attempts. A multi-item batch
+    gets one attempt; if it fails it is split in half, and items missing from
+    a partial result are retried as a smaller batch.
+    Returns item number -> summary item for every item that succeeded.
+    """
+    hn_ids = [str(item.get("hn_id", "")) for _, item in batch]
+    with span("summarize.batch", hn_ids=hn_ids, items=len(batch)) as sp:
+        done = _summarize_batch(prompt, batch, hn_meta)
+        sp["ok"] = len(done)
+        if len(done) < len(batch):
+            sp["error"] = "incomplete"
+        return done
+
+
+def _summarize_batch(prompt: str, batch: list[tuple[int, dict]], hn_meta: dict) -> dict[int, dict]:
+    if len(batch) == 1:
+        num, item = batch[0]
+        result = run_backend(prompt, [item], f"{num:03d}", hn_meta)
+        if result and result.get("items"):
+            return {num: result["items"][0]}
+        return {}
+
+    tag = f"{batch[0][0]:03d}-{batch[-1][0]:03d}"
+    result = run_backend(
+        prompt, [item for _, item in batch], tag, hn_meta, retries=1, timeout=CODEX_TIMEOUT * len(batch)
+    )
+
+    num_by_id = {str(item.get("hn_id", "")): num for num, item in batch}
+    done: dict[int, dict] = {}
+    for s in (result or {}).get("items", []):
+        num = num_by_id.get(str(s.get("hn_id", "")))
+        if num is not None and num not in done:
+            done[num] = s
+
+    missing = [(num, item) for num, item in batch if num not in done]
+    if not missing:
+        return done
+    if done:
+        print(f"  [batch {tag}] {len(missing)}/{len(batch)} items missing, retrying them", file=sys.stderr)
+        done.update(_summarize_batch(prompt, missing, hn_meta))
+    else:
+        print(f"  [batch {tag}] failed, splitting {len(batch)} items", file=sys.stderr)
+        half = len(batch) // 2
+        done.update(_summarize_batch(prompt, batch[:half], hn_meta))
+        done.update(_summarize_batch(prompt, batch[half:], hn_meta))
+    return done
+
+
 def merge_results(parts: list[dict], date_str: str, lang: str) -> dict:
-    """Merge individual codex results into final summaries.json."""
+    """Merge individual codex results into one {"date", "lang", "items"} result."""
     all_items = []
     for part in parts:
         if part and "items" in part:
@@ -132,46 +431,178 @@ def cleanup_temp_files() -> None:
         os.remove(f)
 
 
-def main() -> None:
-    with open(DATA_DIR / "hn_with_text.json", encoding="utf-8") as f:
-        hn = json.load(f)
-
-    items = hn.get("items", [])
-    date_str = hn.get("date", "")
-    prompt = load_prompt()
-    lang = "ja" if "ja" in PROMPT_LANG else "en"
+def summarize_items(
+    items: Iterable[dict],
+    hn_meta: dict,
+    total: int,
+    cache: SummaryCache | None = None,
+    stop: threading.Event | None = None,
+    prompt_lang: str = PROMPT_LANG,
+) -> Iterator[tuple[int, dict, dict | None]]:
+    """Summarize items as they arrive, yielding (num, item, result) in input order.
+
+    Duplicates (duplicate_of) are not summarized and yield result None.
+    Items are served from the summary cache where possible; the rest are
+    grouped into SUMMARIZE_BATCH_SIZE batches and run on up to
+    SUMMARIZE_CONCURRENCY codex processes while later items are still
+    arriving. result is None when every attempt failed. Pass cache to reuse
+    a loaded SummaryCache (daemon.py); otherwise one is loaded per call.
+    Once stop is set, batches that have not started yet are skipped (result None).
+    prompt_lang selects <lang>.txt next to PROMPT_FILE (default: PROMPT_FILE itself).
+    """
+    if SUMMARIZER_BACKEND not in ("codex", "openai"):
+        raise SystemExit(f"Unknown SUMMARIZER_BACKEND={SUMMARIZER_BACKEND!r} (codex|openai)")
+    prompt = load_prompt(prompt_lang)
+    date_str = hn_meta.get("date", "")
+    lang = "ja" if "ja" in prompt_lang else "en"
 
     PARTS_DIR.mkdir(parents=True, exist_ok=True)
 
-    parts: list[dict] = []
-    for idx, item in enumerate(items):
-        num = idx + 1
-        hn_id = item.get("hn_id", "?")
-        title = (item.get("title") or "(no title)")[:60]
-        print(f"[summarize] {num}/{len(items)}: {hn_id} – {title}")
+    if cache is None and SUMMARY_CACHE:
+        cache = SummaryCache(prompt, SCHEMA_FILE.read_text(encoding="utf-8"))
+
+    def summarize_one(batch: list[tuple[int, dict]]) -> dict[int, dict]:
+        if stop is not None and stop.is_set():
+            return {}
+        for num, item in batch:
+            hn_id = item.get("hn_id", "?")
+            title = (item.get("title") or "(no title)")[:60]
+            print(f"[summarize] {num}/{total}: {hn_id} – {title}")
+
+        # File names are keyed by item number, so concurrent workers never collide.
+        return summarize_batch(prompt, batch, hn_meta)
+
+    # Entries are [num, item, cached_result, future]; future is set once the
+    # item's batch has been submitted.
+    pending: deque[list] = deque()
+    batch: list[list] = []
+
+    def drain(block: bool) -> Iterator[tuple[int, dict, dict | None]]:
+        # Yield finished results from the front only, so item order is kept.
+        while pending:
+            num, item, cached, fut = pending[0]
+            dup = item.get("duplicate_of")
+            if not dup and not cached and (fut is None or (not block and not fut.done())):
+                return
+            pending.popleft()
+            if dup:
+                result = None
+            elif cached:
+                result = cached
+                print(f"  -> CACHED ({num}/{total}: {item.get('hn_id', '?')})")
+            else:
+                summary = fut.result().get(num)
+                result = {"date": date_str, "lang": lang, "items": [summary]} if summary else None
+                if result:
+                    print(f"  -> OK ({num}/{total})")
+                    if cache:
+                        cache.put(item, result)
+            yield num, item, result
+
+    with ThreadPoolExecutor(max_workers=SUMMARIZE_CONCURRENCY) as pool:
+        def submit() -> None:
+            fut = pool.submit(summarize_one, [(e[0], e[1]) for e in batch])
+            for e in batch:
+                e[3] = fut
+            batch.clear()
+
+        for idx, item in enumerate(items):
+            if item.get("duplicate_of"):
+                print(f"[summarize] {idx + 1}/{total}: {item.get('hn_id', '?')} duplicates {item['duplicate_of']}, skipped")
+                pending.append([idx + 1, item, None, None])
+                yield from drain(block=False)
+                continue
+            entry = [idx + 1, item, cache.get(item) if cache else None, None]
+            pending.append(entry)
+            if not entry[2]:
+                batch.append(entry)
+                if len(batch) >= SUMMARIZE_BATCH_SIZE:
+                    submit()
+            yield from drain(block=False)
+        if batch:
+            submit()
+        yield from drain(block=True)
+
+    if cache:
+        cache.save()
+        print(f"[summarize] cache hits={cache.hits} misses={cache.misses}")
+    if _latency_stats is not None:
+        _latency_stats.save()
+
+    cleanup_temp_files()
 
-        input_path = make_single_item_input(item, num, hn)
-        output_path = PARTS_DIR / f"part_{num:03d}.json"
 
-        result = run_codex_for_item(prompt, input_path, output_path)
+def summarize_all(items: Iterable[dict], hn_meta: dict, total: int) -> dict:
+    """Summarize items (posting each one if POST_EACH) and return merged summaries."""
+    lang = "ja" if "ja" in PROMPT_LANG else "en"
+    parts: list[dict] = []
+    posted: list[dict] = []
+    numbers: dict[str, int] = {}
+    for num, item, result in summarize_items(story_numbers(items, numbers), hn_meta, total):
+        summary_item = result["items"][0] if result and result.get("items") else None
+        if POST_EACH and (summary_item or item.get("duplicate_of")):
+            story = numbers.get(str(item.get("hn_id", "")), 0)
+            if post_item_to_slack(item, summary_item, story, total, hn_meta.get("date", "")):
+                posted.append(item)
         if result:
             parts.append(result)
-            print(f"  -> OK")
-            if POST_EACH:
-                summary_item = result["items"][0] if result.get("items") else None
-                if summary_item:
-                    time.sleep(SLACK_POST_DELAY)
-                    post_item_to_slack(item, summary_item, num, len(items))
-        else:
-            print(f"  -> SKIPPED (all retries failed)", file=sys.stderr)
-
-    merged = merge_results(parts, date_str, lang)
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(merged, f, ensure_ascii=False, indent=2)
-    print(f"[summarize] Wrote {OUTPUT_FILE} ({len(merged['items'])} items)")
+        elif not item.get("duplicate_of"):
+            print(f"  -> SKIPPED {num}/{total} (all retries failed)", file=sys.stderr)
+    mark_emitted(posted)
+    return merge_results(parts, hn_meta.get("date", ""), lang)
 
-    cleanup_temp_files()
 
+def main() -> None:
+    if use_sqlite():
+        store = StateStore()
+        hn = store.load_run()
+        items = hn["items"]
+        merged = summarize_all(items, hn, len(items))
+        store.put_summaries(hn["date"], merged["lang"], merged["items"])
+        print(f"[summarize] Wrote {STATE_DB} ({len(merged['items'])} items)")
+        return
+
+    header, records = read_artifact(INPUT_FILE)
+    lang = "ja" if "ja" in PROMPT_LANG else "en"
+    out = ArtifactWriter(
+        OUTPUT_FILE,
+        {
+            "stage": "summarize",
+            "date": header.get("date", ""),
+            "lang": lang,
+            "prompt": PROMPT_FILE,
+            "backend": SUMMARIZER_BACKEND,
+            "stories": header.get("stories", ""),
+        },
+    )
+    done = {str(x.get("hn_id", "")) for x in out.completed()}
+    if done:
+        print(f"[summarize] Resuming {OUTPUT_FILE}: {len(done)} items already summarized")
+    numbers: dict[str, int] = {}
+    todo = (it for it in story_numbers(records, numbers) if str(it.get("hn_id", "")) not in done)
+    total = max(0, header.get("total", 0) - len(done))
+
+    written = len(done)
+    posted: list[dict] = []
+    for num, item, result in summarize_items(todo, header, total):
+        story = numbers.get(str(item.get("hn_id", "")), 0)
+        if item.get("duplicate_of"):
+            if POST_EACH and post_item_to_slack(item, None, story, total, header.get("date", "")):
+                posted.append(item)
+            continue
+        if not result:
+            print(f"  -> SKIPPED {num}/{total} (all retries failed)", file=sys.stderr)
+            continue
+        for summary_item in result.get("items", []):
+            out.write(summary_item)
+            written += 1
+        if POST_EACH and result.get("items"):
+            if post_item_to_slack(item, result["items"][0], story, total, header.get("date", "")):
+                posted.append(item)
+    out.commit()
+    mark_emitted(posted)
+    print(f"[summarize] Wrote {OUTPUT_FILE} ({written} items)")
 
 if __name__ == "__main__":
-    main()
+    with span("stage", stage="summarize"):
+        main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Persistent summary cache for summarize.py.
+
+Entries are keyed by hn_id and a content hash of everything that feeds the
+LLM (source_text, comment_texts, body_source, prompt text and schema.json),
+so unchanged stories can reuse the previous codex result across runs.
+
+A story whose article and prompt are unchanged but which gained a few
+comments is also served from the cache until the unseen comments reach
+SUMMARY_CACHE_MIN_NEW_COMMENTS and SUMMARY_CACHE_NEW_COMMENTS_RATIO of the
+comments it was summarized with; an active thread gains some on every run.
+
+Every put() is also appended (and fsynced) to <file>.journal, which is
+replayed on load and removed by save(), so summaries finished before a
+crash are not paid for again.
+"""
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SUMMARY_CACHE = os.getenv("SUMMARY_CACHE", "true").lower() in ("1", "true", "yes")
+SUMMARY_CACHE_FILE = Path(os.getenv("SUMMARY_CACHE_FILE", "data/summary_cache.json"))
+SUMMARY_CACHE_MIN_NEW_COMMENTS = max(1, int(os.getenv("SUMMARY_CACHE_MIN_NEW_COMMENTS", "10")))
+SUMMARY_CACHE_NEW_COMMENTS_RATIO = float(os.getenv("SUMMARY_CACHE_NEW_COMMENTS_RATIO", "0.3"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "500"))
+SUMMARY_CACHE_MAX_AGE_DAYS = float(os.getenv("SUMMARY_CACHE_MAX_AGE_DAYS", "7"))
+
+
+def _sha(*parts) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, prompt: str, schema_text: str, path: Path = SUMMARY_CACHE_FILE):
+        self.path = path
+        self.journal = path.with_name(path.name + ".journal")
+        self.context = _sha(prompt, schema_text)
+        self.entries: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        if path.exists():
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f).get("entries", {})
+            except Exception:
+                self.entries = {}
+        if self.journal.exists():
+            with open(self.journal, "rb") as f:
+                for line in f:
+                    try:
+                        key, entry = json.loads(line)
+                    except ValueError:
+                        break  # torn write from the crash
+                    self.entries[key] = entry
+
+    def _fingerprint(self, item: dict) -> dict:
+        hn_id = str(item.get("hn_id", ""))
+        source = _sha(item.get("source_text") or "", item.get("body_source") or "")
+        comments = [_sha(c)[:16] for c in item.get("comment_texts") or []]
+        return {
+            "hn_id": hn_id,
+            "key": _sha(hn_id, self.context, source, comments),
+            "source": source,
+            "comments": comments,
+        }
+
+    def _entry_key(self, fp: dict) -> str:
+        # One entry per story and prompt, so languages (fanout.py) don't evict each other
+        return f"{fp['hn_id']}@{self.context[:12]}"
+
+    def get(self, item: dict) -> dict | None:
+        """Return a cached codex result for item, or None if it must be re-summarized."""
+        fp = self._fingerprint(item)
+        entry = self.entries.get(self._entry_key(fp))
+        hit = False
+        if entry:
+            if entry.get("key") == fp["key"]:
+                hit = True
+            elif entry.get("context") == self.context and entry.get("source") == fp["source"]:
+                seen = set(entry.get("comments", []))
+                new_comments = sum(1 for c in fp["comments"] if c not in seen)
+                needed = max(SUMMARY_CACHE_MIN_NEW_COMMENTS, SUMMARY_CACHE_NEW_COMMENTS_RATIO * len(seen))
+                hit = new_comments < needed
+        if not hit:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["used_at"] = time.time()
+        return entry["result"]
+
+    def put(self, item: dict, result: dict) -> None:
+        fp = self._fingerprint(item)
+        now = time.time()
+        key = self._entry_key(fp)
+        self.entries[key] = {
+            "key": fp["key"],
+            "context": self.context,
+            "source": fp["source"],
+            "comments": fp["comments"],
+            "result": result,
+            "created_at": now,
+            "used_at": now,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.journal, "ab") as f:
+            f.write((json.dumps([key, self.entries[key]], ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def evict(self) -> None:
+        """Drop entries older than the max age, then least-recently-used ones over the size cap."""
+        cutoff = time.time() - SUMMARY_CACHE_MAX_AGE_DAYS * 86400
+        self.entries = {k: v for k, v in self.entries.items() if v.get("created_at", 0) >= cutoff}
+        if len(self.entries) > SUMMARY_CACHE_MAX_ENTRIES:
+            keep = sorted(self.entries.items(), key=lambda kv: kv[1].get("used_at", 0), reverse=True)
+            self.entries = dict(keep[:SUMMARY_CACHE_MAX_ENTRIES])
+
+    def save(self) -> None:
+        self.evict()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+        self.journal.unlink(missing_ok=True)
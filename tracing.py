@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Per-run tracing: timed spans, a latency summary and Prometheus metrics.
+
+Code wraps work in `with span("http", domain=...) as sp:` and may add
+attributes (sp["status"] = 200). Spans are kept in memory and, when the
+process exits, appended to data/traces/<run_id>.jsonl. run.sh exports
+TRACE_RUN_ID so all stages of one run share a file; a stage run on its own
+gets its own id.
+
+After every flush the whole run's trace is summarized into
+<run_id>.summary.json (count / p50 / p95 / max per span name, stage
+durations, slowest domains and items), and, with METRICS_TEXTFILE set,
+into a Prometheus textfile-collector file.
+
+Span names: stage, http (until response headers), article (download +
+extract), extract, comments, summarize.batch, codex / llm (one attempt),
+slack.post (one message, including retries).
+
+Usage:
+  python tracing.py [run_id | path/to/trace.jsonl]   # print a run's summary
+"""
+import atexit
+import itertools
+import json
+import math
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TRACE = os.getenv("TRACE", "true").lower() in ("1", "true", "yes")
+TRACE_DIR = Path(os.getenv("TRACE_DIR", "data/traces"))
+TRACE_RUN_ID = os.getenv("TRACE_RUN_ID", "").strip() or time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+# Trace files (runs) kept in TRACE_DIR; older ones are deleted
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "30"))
+# e.g. /var/lib/node_exporter/textfile/hn_digest.prom (empty disables)
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE", "").strip()
+
+_spans: list[dict] = []
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_local = threading.local()
+
+
+@contextmanager
+def span(name: str, **attrs) -> Iterator[dict]:
+    """Time the with-block as a span; the yielded dict holds its attributes."""
+    if not TRACE:
+        yield attrs
+        return
+    span_id = f"{os.getpid()}-{next(_ids)}"
+    stack = _local.__dict__.setdefault("stack", [])
+    parent = stack[-1] if stack else None
+    stack.append(span_id)
+    start = time.time()
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        if not isinstance(e, SystemExit) or e.code not in (None, 0):
+            attrs.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        stack.pop()
+        record = {
+            "name": name,
+            "id": span_id,
+            "parent": parent,
+            "start": round(start, 6),
+            "dur": round(time.perf_counter() - t0, 6),
+            "thread": threading.current_thread().name,
+            "attrs": attrs,
+        }
+        with _lock:
+            _spans.append(record)
+
+
+def start_run(run_id: str = "") -> str:
+    """Flush pending spans and switch to a new run id (one per daemon.py cycle)."""
+    global TRACE_RUN_ID
+    flush()
+    TRACE_RUN_ID = run_id or time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+    return TRACE_RUN_ID
+
+
+def trace_path(run_id: str = "") -> Path:
+    return TRACE_DIR / f"{run_id or TRACE_RUN_ID}.jsonl"
+
+
+def flush() -> Path | None:
+    """Append buffered spans to the run's trace file and refresh its summary."""
+    with _lock:
+        spans, _spans[:] = list(_spans), []
+    if not spans:
+        return None
+    TRACE_DIR.mkdir(parents=True, exist_ok=True)
+    path = trace_path()
+    lines = "".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in spans)
+    # One write per process; stages of a run.sh run never flush concurrently
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(lines)
+
+    summary = summarize(list(read_trace(path)))
+    summary["run_id"] = TRACE_RUN_ID
+    _write_atomic(TRACE_DIR / f"{TRACE_RUN_ID}.summary.json", json.dumps(summary, indent=2))
+    if METRICS_TEXTFILE:
+        _write_atomic(Path(METRICS_TEXTFILE), prometheus_text(summary))
+    _prune()
+    print(f"[trace] {len(spans)} spans -> {path}", file=sys.stderr)
+    return path
+
+
+def read_trace(path: Path) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def _stats(durations: list[float]) -> dict:
+    d = sorted(durations)
+    return {
+        "count": len(d),
+        "total": round(sum(d), 6),
+        "p50": percentile(d, 0.5),
+        "p95": percentile(d, 0.95),
+        "max": d[-1] if d else 0.0,
+    }
+
+
+def summarize(spans: list[dict], top: int = 10) -> dict:
+    by_name: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    stages: dict[str, float] = {}
+    by_domain: dict[str, list[float]] = {}
+    by_item: dict[str, float] = {}
+    for s in spans:
+        a = s.get("attrs", {})
+        by_name.setdefault(s["name"], []).append(s["dur"])
+        if a.get("error"):
+            errors[s["name"]] = errors.get(s["name"], 0) + 1
+        if s["name"] == "stage":
+            stages[a.get("stage", "?")] = stages.get(a.get("stage", "?"), 0.0) + s["dur"]
+        if s["name"] in ("article", "comments") and a.get("domain"):
+            by_domain.setdefault(a["domain"], []).append(s["dur"])
+        if s["name"] in ("article", "comments", "summarize.batch"):
+            for hn_id in a.get("hn_ids") or [a.get("hn_id")]:
+                if hn_id:
+                    by_item[hn_id] = by_item.get(hn_id, 0.0) + s["dur"]
+
+    names = {n: {**_stats(d), "errors": errors.get(n, 0)} for n, d in sorted(by_name.items())}
+    domains = sorted(({"domain": k, **_stats(v)} for k, v in by_domain.items()), key=lambda x: -x["total"])
+    items = sorted(({"hn_id": k, "total": round(v, 6)} for k, v in by_item.items()), key=lambda x: -x["total"])
+    return {
+        "spans": len(spans),
+        "stages": {k: round(v, 6) for k, v in stages.items()},
+        "by_name": names,
+        "slowest_domains": domains[:top],
+        "slowest_items": items[:top],
+    }
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(summary: dict) -> str:
+    out = [
+        "# HELP hn_digest_span_seconds Span durations in the last run, by span name.",
+        "# TYPE hn_digest_span_seconds summary",
+    ]
+    for name, st in summary["by_name"].items():
+        n = _label(name)
+        out.append(f'hn_digest_span_seconds{{span="{n}",quantile="0.5"}} {st["p50"]}')
+        out.append(f'hn_digest_span_seconds{{span="{n}",quantile="0.95"}} {st["p95"]}')
+        out.append(f'hn_digest_span_seconds_sum{{span="{n}"}} {st["total"]}')
+        out.append(f'hn_digest_span_seconds_count{{span="{n}"}} {st["count"]}')
+    out += [
+        "# HELP hn_digest_span_errors Spans that ended with an error in the last run.",
+        "# TYPE hn_digest_span_errors gauge",
+    ]
+    for name, st in summary["by_name"].items():
+        out.append(f'hn_digest_span_errors{{span="{_label(name)}"}} {st["errors"]}')
+    out += [
+        "# HELP hn_digest_stage_seconds Wall time of each stage in the last run.",
+        "# TYPE hn_digest_stage_seconds gauge",
+    ]
+    for stage, sec in summary["stages"].items():
+        out.append(f'hn_digest_stage_seconds{{stage="{_label(stage)}"}} {sec}')
+    out += [
+        "# HELP hn_digest_last_run_timestamp_seconds When the last run's metrics were written.",
+        "# TYPE hn_digest_last_run_timestamp_seconds gauge",
+        f"hn_digest_last_run_timestamp_seconds {time.time():.0f}",
+    ]
+    return "\n".join(out) + "\n"
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _prune() -> None:
+    traces = sorted(TRACE_DIR.glob("*.jsonl"), key=lambda p: p.stat().st_mtime)
+    for old in traces[: max(0, len(traces) - TRACE_KEEP)]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".summary.json").unlink(missing_ok=True)
+
+
+def format_summary(summary: dict) -> str:
+    lines = [f"run {summary.get('run_id', '?')}: {summary['spans']} spans"]
+    for stage, sec in summary["stages"].items():
+        lines.append(f"  stage {stage:22s} {sec:8.3f}s")
+    lines.append(f"  {'span':28s} {'count':>6s} {'p50':>8s} {'p95':>8s} {'max':>8s} {'errors':>6s}")
+    for name, st in summary["by_name"].items():
+        lines.append(
+            f"  {name:28s} {st['count']:6d} {st['p50']:8.3f} {st['p95']:8.3f} {st['max']:8.3f} {st['errors']:6d}"
+        )
+    if summary["slowest_domains"]:
+        lines.append("  slowest domains (total s / p95 s):")
+        for d in summary["slowest_domains"]:
+            lines.append(f"    {d['domain']:34s} {d['total']:8.3f} {d['p95']:8.3f}")
+    if summary["slowest_items"]:
+        lines.append("  slowest items (total s):")
+        for it in summary["slowest_items"]:
+            lines.append(f"    {it['hn_id']:34s} {it['total']:8.3f}")
+    return "\n".join(lines)
+
+
+if TRACE:
+    atexit.register(flush)
+
+
+def main() -> None:
+    if not TRACE:
+        return
+    arg = sys.argv[1] if len(sys.argv) > 1 else TRACE_RUN_ID
+    path = Path(arg) if arg.endswith(".jsonl") else trace_path(arg)
+    if not path.exists():
+        raise SystemExit(f"No trace at {path}")
+    summary = summarize(list(read_trace(path)))
+    summary["run_id"] = path.stem
+    print(format_summary(summary))
+
+
+if __name__ == "__main__":
+    main()